@@ -12,9 +12,6 @@ import os
 import shutil
 import subprocess
 import sys
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
 
 def install_dependencies():
     required_packages = ["tkinterdnd2", "numpy"]
@@ -30,9 +27,17 @@ def purge_genR_folder():
         shutil.rmtree(output_dir)
     os.makedirs(output_dir)
 
-def replace_values_in_csv(csv_file, config_file, output_file):
+def load_replacements(config_file):
+    """Load the response text -> numeric value mapping from Config.json"""
     with open(config_file, 'r', encoding='utf-8') as f:
-        replacements = json.load(f)
+        return json.load(f)
+
+def replace_row_values(row, replacements):
+    """Replace every cell of a row that has a Config.json mapping"""
+    return [replacements.get(cell, cell) for cell in row]
+
+def replace_values_in_csv(csv_file, config_file, output_file):
+    replacements = load_replacements(config_file)
     
     output_dir = os.path.join(os.path.dirname(__file__), "genR")
     if not os.path.exists(output_dir):
@@ -44,8 +49,7 @@ def replace_values_in_csv(csv_file, config_file, output_file):
         writer = csv.writer(outfile)
         
         for row in reader:
-            new_row = [replacements.get(cell, cell) for cell in row]
-            writer.writerow(new_row)
+            writer.writerow(replace_row_values(row, replacements))
     
     print("CSV processing completed successfully")
 
@@ -94,5 +98,9 @@ def create_ui():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Only the standalone tool needs tkinter; importing this module never loads it
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+    from tkinter import ttk
     install_dependencies()
     create_ui()
@@ -1,5 +1,4 @@
 import tkinter as tk
-from PIL import Image, ImageTk
 import os
 
 class SplashScreen(tk.Toplevel):
@@ -59,6 +58,11 @@ class SplashScreen(tk.Toplevel):
         self.progress.coords(self.progress_bar, 0, 0, width, 2)
         self.update()
 
+    def step(self, text, value):
+        """Show the initialization step under way and how far along it is"""
+        self.loading_label.config(text=text)
+        self.update_progress(value)
+
     def finish(self):
         """Close splash screen"""
         self.destroy()
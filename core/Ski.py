@@ -7,14 +7,16 @@ the Free Software Foundation, either version 3 of the License.
 """
 
 import csv
+import heapq
+import multiprocessing
 import os
 import shutil
 import subprocess
 import sys
 import numpy as np
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinter import ttk
+from multiprocessing import shared_memory
+from core.rankstore import NO_MATCHES
+from utils.file_handlers import write_csv_rows
 
 def install_dependencies():
     required_packages = ["tkinterdnd2", "numpy"]
@@ -42,35 +44,58 @@ def process_csv(file_path):
     return data
 
 # Function to form coordinate pairs and calculate distances
-def calculate_distances(data):
-    """Calculate distances between all possible overlapping pairs of responses"""
-    distances = []
-    for row in data:
-        email = row[0]
-        # Convert all numeric values, excluding email
-        values = [float(x) for x in row[1:]]
-        coordinates = []
-        
-        # Create ALL possible overlapping pairs
-        for i in range(len(values)):
-            for j in range(i + 1, len(values)):
-                coordinates.append((values[i], values[j]))
-        
-        # Calculate midpoint of all coordinates
-        midpoint = calculate_midpoint(coordinates)
-        
-        # Calculate distances from midpoint to each coordinate pair
-        row_distances = [calculate_distance(midpoint, point) for point in coordinates]
-        distances.append([email] + row_distances)
-        
-        # Debug print
-        print(f"Email: {email}")
-        print(f"Number of pairs: {len(coordinates)}")
-        print(f"Coordinates: {coordinates[:5]}...")  # Print first 5 pairs
-        print(f"Number of distances: {len(row_distances)}\n")
-    
+def calculate_distances(data, verbose=False):
+    """Calculate distances between all possible overlapping pairs of responses
+
+    Every (values[i], values[j]) pair with i < j is a point; each respondent's
+    features are the distances from those points to their midpoint. The pair
+    indices are computed once and applied to the whole survey at once.
+    """
+    distances = [None] * len(data)
+
+    # Rows are grouped by answer count so each group is one rectangular array
+    rows_by_length = {}
+    for index, row in enumerate(data):
+        rows_by_length.setdefault(len(row), []).append(index)
+
+    for length, indices in rows_by_length.items():
+        values = np.array([data[index][1:] for index in indices], dtype=np.float64).reshape(len(indices), length - 1)
+        features = pair_midpoint_distances(values)
+        for index, row_distances in zip(indices, features.tolist()):
+            distances[index] = [data[index][0]] + row_distances
+
+    if verbose:
+        for row, row_distances in zip(data, distances):
+            values = [float(x) for x in row[1:]]
+            first, second = np.triu_indices(len(values), k=1)
+            coordinates = [(values[i], values[j]) for i, j in zip(first[:5], second[:5])]
+            print(f"Email: {row[0]}")
+            print(f"Number of pairs: {len(row_distances) - 1}")
+            print(f"Coordinates: {coordinates}...")  # Print first 5 pairs
+            print(f"Number of distances: {len(row_distances) - 1}\n")
+
     return distances
 
+def calculate_respondent_distances(respondents):
+    """calculate_distances for a RespondentTable, straight from its answer matrix"""
+    features = pair_midpoint_distances(respondents.answers)
+    return [[email] + row_distances for email, row_distances in zip(respondents.emails, features.tolist())]
+
+def pair_midpoint_distances(values):
+    """Distances from each (values[i], values[j]) pair, i < j, to the pairs' midpoint
+
+    values is an (n, k) array; the result is (n, k * (k - 1) / 2) in the same
+    pair order as a nested i < j loop.
+    """
+    first, second = np.triu_indices(values.shape[1], k=1)
+    if len(first) == 0:
+        return np.empty((values.shape[0], 0))
+    x_coords = values[:, first]
+    y_coords = values[:, second]
+    midpoint_x = x_coords.sum(axis=1, keepdims=True) / len(first)
+    midpoint_y = y_coords.sum(axis=1, keepdims=True) / len(first)
+    return np.sqrt((midpoint_x - x_coords) ** 2 + (midpoint_y - y_coords) ** 2)
+
 # Function to calculate the midpoint of a set of points
 def calculate_midpoint(points):
     """Calculate the midpoint of a set of points"""
@@ -84,9 +109,261 @@ def calculate_midpoint(points):
 def calculate_distance(point1, point2):
     return np.sqrt((point1[0] - point2[0]) ** 2 + (point1[1] - point2[1]) ** 2)
 
+# Similarity engines selectable from process_files
+SIMILARITY_ENGINES = ("numpy", "loop")
+DEFAULT_SIMILARITY_ENGINE = "numpy"
+
+# Rows of the n x n distance matrix computed per block by the numpy engine
+SIMILARITY_BLOCK_SIZE = 1024
+
 # Function to compare each row with every other row to determine a "list of similarity"
-def calculate_similarity(data):
-    """Calculate normalized similarity scores between users"""
+def calculate_similarity(data, engine=DEFAULT_SIMILARITY_ENGINE, block_size=SIMILARITY_BLOCK_SIZE, top_k=None, workers=1):
+    """Calculate normalized similarity scores between users with the selected engine
+
+    With top_k set, each list keeps only the top_k best candidates instead of
+    all n - 1 other users. workers > 1 shards the numpy engine across processes.
+    """
+    if engine == "numpy":
+        return calculate_similarity_numpy(data, block_size=block_size, top_k=top_k, workers=workers)
+    if engine == "loop":
+        return calculate_similarity_loop(data, top_k=top_k)
+    raise ValueError(f"Unknown similarity engine: {engine}")
+
+def load_similarity_matrix(data):
+    """Load [email, value, ...] rows into an email list and a contiguous float matrix"""
+    emails = [row[0] for row in data]
+    matrix = np.array([row[1:] for row in data], dtype=np.float64)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(emails), -1)
+    return emails, np.ascontiguousarray(matrix)
+
+def top_k_order(scores, top_k):
+    """Indices of the top_k highest scores, best first, ties in original order
+
+    Uses argpartition so only the selected candidates are sorted.
+    """
+    if top_k is None or top_k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    if top_k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth_score = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+    # Include every candidate tied with the k-th score so ties resolve by index
+    candidates = np.flatnonzero(scores >= kth_score)
+    ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return ranked[:top_k]
+
+def calculate_similarity_numpy(data, block_size=SIMILARITY_BLOCK_SIZE, top_k=None, workers=1):
+    """Calculate normalized similarity scores using blocked matrix operations
+
+    Produces the same ranked lists as calculate_similarity_loop: pairwise
+    Euclidean distances come from ||a||^2 + ||b||^2 - 2ab (see
+    block_squared_distances), scores use the same exponential decay and
+    per-row min/max normalization, and ties keep the original row order.
+    """
+    emails, matrix = load_similarity_matrix(data)
+    print(f"\nProcessing similarity for {len(emails)} entries (numpy engine)")
+
+    similarity = []
+    for block in iter_similarity_blocks(emails, matrix, block_size, top_k, workers):
+        similarity.extend(block)
+    return similarity
+
+def duplicate_representatives(matrix):
+    """First row with the same values as each row, or None if no two rows match"""
+    _, first, inverse = np.unique(matrix, axis=0, return_index=True, return_inverse=True)
+    if len(first) == len(matrix):
+        return None
+    return first[inverse.ravel()]
+
+def block_squared_distances(matrix, squared_norms, start, stop, representatives=None):
+    """Squared distances from rows start:stop to every row
+
+    ||a||^2 + ||b||^2 - 2ab rounds differently from column to column, so
+    users with identical answers would come out at slightly different
+    distances and lose the tie the loop engine gives them. With the
+    representatives of duplicate_representatives, identical users share
+    their first row's column and are exactly 0 from each other.
+    """
+    squared_dist = squared_norms[start:stop, None] + squared_norms[None, :] - 2.0 * (matrix[start:stop] @ matrix.T)
+    np.maximum(squared_dist, 0.0, out=squared_dist)
+    if representatives is not None:
+        squared_dist = squared_dist[:, representatives]
+        squared_dist[representatives[start:stop, None] == representatives[None, :]] = 0.0
+    return squared_dist
+
+def rank_similarity_block(matrix, squared_norms, start, stop, top_k=None, representatives=None):
+    """Rank every other user for rows start:stop, as arrays of row indices"""
+    n = matrix.shape[0]
+    rows = np.arange(stop - start)
+
+    squared_dist = block_squared_distances(matrix, squared_norms, start, stop, representatives)
+    scores = np.exp(-np.sqrt(squared_dist))
+    del squared_dist
+
+    # Exclude each user from their own list
+    others = np.ones(scores.shape, dtype=bool)
+    others[rows, start + rows] = False
+    max_score = np.max(scores, axis=1, where=others, initial=-np.inf)
+    min_score = np.min(scores, axis=1, where=others, initial=np.inf)
+    del others
+    score_range = max_score - min_score
+    score_range[score_range == 0] = 1
+
+    normalized = scores
+    normalized -= min_score[:, None]
+    normalized /= score_range[:, None]
+    normalized[rows, start + rows] = -np.inf
+
+    if top_k is None or top_k >= n - 1:
+        # Stable descending sort; the user themself lands last and is dropped
+        return list(np.argsort(-normalized, axis=1, kind='stable')[:, :-1])
+    return [top_k_order(row, top_k) for row in normalized]
+
+def rank_bucketed_block(matrix, squared_norms, start, stop, buckets, top_k=None, representatives=None):
+    """Rank rows start:stop against only the columns their bucket accepts
+
+    buckets is (row_codes, code_columns): row i may only list the sorted
+    column ids code_columns[row_codes[i]] (none for code -1). Distances are
+    still taken to everyone so each row is normalized by the same nearest
+    and farthest user as in rank_similarity_block, but scores, normalization
+    and the sort only run over the accepted columns. The lists equal the
+    full lists with every other column removed, cut to top_k if set.
+    """
+    row_codes, code_columns = buckets
+    rows = np.arange(stop - start)
+
+    squared_dist = block_squared_distances(matrix, squared_norms, start, stop, representatives)
+
+    # exp(-sqrt(d)) falls as d grows, so the extremes come from the distances
+    others = np.ones(squared_dist.shape, dtype=bool)
+    others[rows, start + rows] = False
+    max_score = np.exp(-np.sqrt(np.min(squared_dist, axis=1, where=others, initial=np.inf)))
+    min_score = np.exp(-np.sqrt(np.max(squared_dist, axis=1, where=others, initial=-np.inf)))
+    del others
+    score_range = max_score - min_score
+    score_range[score_range == 0] = 1
+
+    ranked = [np.empty(0, dtype=np.intp)] * len(rows)
+    block_codes = row_codes[start:stop]
+    for code in np.unique(block_codes).tolist():
+        columns = code_columns[code] if code >= 0 else np.empty(0, dtype=np.intp)
+        if not len(columns):
+            continue
+        members = np.flatnonzero(block_codes == code)
+
+        normalized = np.exp(-np.sqrt(squared_dist[np.ix_(members, columns)]))
+        normalized -= min_score[members, None]
+        normalized /= score_range[members, None]
+
+        # Users whose own column is accepted are moved to the end and dropped
+        own = np.minimum(np.searchsorted(columns, start + members), len(columns) - 1)
+        listed_self = columns[own] == start + members
+        normalized[np.flatnonzero(listed_self), own[listed_self]] = -np.inf
+
+        if top_k is None or top_k >= len(columns):
+            order = np.argsort(-normalized, axis=1, kind='stable')
+            drop = listed_self.tolist()
+        else:
+            # The -inf own column is never among the top_k
+            order = [top_k_order(row, top_k) for row in normalized]
+            drop = [False] * len(members)
+        for member, row_order, drop_self in zip(members.tolist(), order, drop):
+            ranked[member] = columns[row_order[:-1] if drop_self else row_order]
+    return ranked
+
+def iter_ranked_blocks(matrix, block_size=SIMILARITY_BLOCK_SIZE, top_k=None, workers=1, buckets=None, first=0):
+    """Yield (start, ranked rows) for each block of block_size users from row first on
+
+    Ranked rows are arrays of candidate row ids, best first. Only one
+    block_size x n slice of the distance matrix exists at a time per process.
+    With workers > 1 the blocks are shared out to a process pool and still
+    yielded in order; the blocks are the same whatever the worker count, so
+    the output is too. With buckets set (see rank_bucketed_block) each row
+    is ranked against its accepted columns, so top_k counts those only.
+    """
+    n = matrix.shape[0]
+    if n < 2:
+        yield first, [np.empty(0, dtype=np.intp) for _ in range(first, n)]
+        return
+
+    ranges = [(start, min(start + block_size, n)) for start in range(first, n, block_size)]
+    representatives = duplicate_representatives(matrix)
+
+    if workers > 1 and len(ranges) > 1:
+        ranked_blocks = _rank_blocks_in_pool(matrix, ranges, top_k, min(workers, len(ranges)), buckets,
+                                             representatives)
+    else:
+        squared_norms = np.einsum('ij,ij->i', matrix, matrix)
+        if buckets is not None:
+            ranked_blocks = (rank_bucketed_block(matrix, squared_norms, start, stop, buckets, top_k, representatives)
+                             for start, stop in ranges)
+        else:
+            ranked_blocks = (rank_similarity_block(matrix, squared_norms, start, stop, top_k, representatives)
+                             for start, stop in ranges)
+
+    for (start, _), ranked_rows in zip(ranges, ranked_blocks):
+        yield start, ranked_rows
+
+def iter_similarity_blocks(emails, matrix, block_size=SIMILARITY_BLOCK_SIZE, top_k=None, workers=1):
+    """Yield the ranked [email, match, ...] rows of each block of block_size users"""
+    for start, ranked_rows in iter_ranked_blocks(matrix, block_size, top_k, workers):
+        yield [[emails[start + offset]] + ([emails[j] for j in ranked] if len(ranked) else [NO_MATCHES])
+               for offset, ranked in enumerate(ranked_rows)]
+
+# Respondent matrix attached from shared memory in each pool worker
+_worker_state = {}
+
+def _attach_shared_matrix(shm_name, shape, top_k, buckets=None, representatives=None):
+    """Pool initializer: map the shared respondent matrix without copying it"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _worker_state['shm'] = shm
+    _worker_state['matrix'] = matrix
+    _worker_state['squared_norms'] = np.einsum('ij,ij->i', matrix, matrix)
+    _worker_state['top_k'] = top_k
+    _worker_state['buckets'] = buckets
+    _worker_state['representatives'] = representatives
+
+def _rank_shared_block(row_range):
+    """Pool task: rank one row range of the shared matrix"""
+    start, stop = row_range
+    if _worker_state['buckets'] is not None:
+        ranked_rows = rank_bucketed_block(_worker_state['matrix'], _worker_state['squared_norms'],
+                                          start, stop, _worker_state['buckets'], _worker_state['top_k'],
+                                          _worker_state['representatives'])
+    else:
+        ranked_rows = rank_similarity_block(_worker_state['matrix'], _worker_state['squared_norms'],
+                                            start, stop, _worker_state['top_k'], _worker_state['representatives'])
+    return [ranked.astype(np.int32) for ranked in ranked_rows]
+
+def _rank_blocks_in_pool(matrix, ranges, top_k, workers, buckets=None, representatives=None):
+    """Rank row ranges in a process pool sharing the matrix through shared memory"""
+    shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    try:
+        shared = np.ndarray(matrix.shape, dtype=np.float64, buffer=shm.buf)
+        shared[:] = matrix
+        with multiprocessing.Pool(workers, initializer=_attach_shared_matrix,
+                                  initargs=(shm.name, matrix.shape, top_k, buckets, representatives)) as pool:
+            # imap keeps the blocks in row order
+            for ranked_rows in pool.imap(_rank_shared_block, ranges):
+                yield ranked_rows
+    finally:
+        shm.close()
+        shm.unlink()
+
+# Approximate bytes of working memory per cell of a block x n distance slice
+SIMILARITY_BYTES_PER_CELL = 40
+
+def block_size_for_memory(n, max_memory_mb):
+    """Largest row block whose distance slice fits in max_memory_mb"""
+    if not max_memory_mb:
+        return SIMILARITY_BLOCK_SIZE
+    budget = int(max_memory_mb * 1024 * 1024)
+    return max(1, min(n, budget // (SIMILARITY_BYTES_PER_CELL * max(n, 1))))
+
+# Reference implementation: compare each row with every other row in pure Python
+def calculate_similarity_loop(data, top_k=None):
+    """Calculate normalized similarity scores between users one pair at a time"""
     similarity = []
     print(f"\nProcessing similarity for {len(data)} entries")
     
@@ -128,9 +405,13 @@ def calculate_similarity(data):
             ]
             
             # Sort by normalized similarity score (higher is better)
-            sorted_similarities = sorted(normalized_similarities, 
-                                      key=lambda x: x[1], 
-                                      reverse=True)
+            if top_k is not None and top_k < len(normalized_similarities):
+                sorted_similarities = heapq.nlargest(top_k, normalized_similarities,
+                                                     key=lambda x: x[1])
+            else:
+                sorted_similarities = sorted(normalized_similarities, 
+                                          key=lambda x: x[1], 
+                                          reverse=True)
             
             # Create list of sorted emails
             sorted_emails = [sim[0] for sim in sorted_similarities]
@@ -147,25 +428,27 @@ def calculate_similarity(data):
     
     return similarity
 
-# Function to save processed data to a CSV file
-def save_processed_data(data, filename):
-    """Save processed data with verification"""
+def genR_output_path(filename):
+    """Path of filename inside the core/genR results folder"""
     output_dir = os.path.join(os.path.dirname(__file__), "genR")
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    
-    output_path = os.path.join(output_dir, os.path.basename(filename))
+    return os.path.join(output_dir, os.path.basename(filename))
+
+# Function to save processed data to a CSV file
+def save_processed_data(data, filename, fsync=False):
+    """Save processed data, verifying it from the row count and checksum taken while writing
+
+    data may be a list or any iterator of rows. Returns the CSVWriteStats, or
+    None if the save failed.
+    """
+    output_path = genR_output_path(filename)
     
     try:
-        with open(output_path, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerows(data)
-        
-        # Verify the save
-        with open(output_path, 'r') as file:
-            saved_data = list(csv.reader(file))
-            print(f"\nSaved {len(saved_data)} rows to {output_path}")
-            print(f"First row length: {len(saved_data[0])} elements")
+        stats = write_csv_rows(output_path, data, fsync=fsync)
+        print(f"\nSaved {stats.rows} rows to {output_path}")
+        print(f"SHA-256: {stats.checksum}")
+        return stats
     except Exception as e:
         print(f"Error saving/verifying data: {str(e)}")
 
@@ -221,5 +504,9 @@ def create_ui():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Only the standalone tool needs tkinter; importing this module never loads it
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+    from tkinter import ttk
     install_dependencies()
     create_ui()
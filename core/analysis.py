@@ -3,8 +3,11 @@ import os
 from typing import List, Dict, Tuple
 
 class MatchAnalysis:
-    def __init__(self, genR_path: str):
+    def __init__(self, genR_path: str, respondents=None, timings: Dict[str, float] = None):
         self.genR_path = genR_path
+        self.respondents = respondents
+        # Seconds per algorithm, keyed by output folder name
+        self.timings = timings or {}
         self.summary_data = {}
     
     def analyze_all_algorithms(self):
@@ -13,7 +16,8 @@ class MatchAnalysis:
             'Greedy': ('greed', 'optimal_pairs.csv'),
             'Hungarian': ('gluttony', 'optimal_pairs.csv'),
             'Grade-Sensitive Greedy': ('sgreed', 'optimal_pairs.csv'),
-            'Grade-Sensitive Hungarian': ('sgluttony', 'optimal_pairs.csv')
+            'Grade-Sensitive Hungarian': ('sgluttony', 'optimal_pairs.csv'),
+            'Blossom': ('blossom', 'optimal_pairs.csv')
         }
         
         results = {}
@@ -21,6 +25,8 @@ class MatchAnalysis:
             filepath = os.path.join(self.genR_path, subdir, filename)
             if os.path.exists(filepath):
                 results[algo_name] = self.analyze_matches(filepath)
+                if subdir in self.timings:
+                    results[algo_name]['runtime'] = self.timings[subdir]
         
         self.generate_summary(results)
     
@@ -29,6 +35,7 @@ class MatchAnalysis:
         stats = {
             'total_pairs': 0,
             'avg_match_quality': 0.0,
+            'total_match_quality': 0.0,
             'grade_differences': {},
             'same_grade_pairs': 0,
             'different_grade_pairs': 0,
@@ -57,6 +64,7 @@ class MatchAnalysis:
                         else:
                             stats['different_grade_pairs'] += 1
         
+        stats['total_match_quality'] = stats['avg_match_quality']
         if stats['total_pairs'] > 0:
             stats['avg_match_quality'] /= stats['total_pairs']
         
@@ -73,12 +81,19 @@ class MatchAnalysis:
                 f.write(f"\n{algo_name} Algorithm Results:\n")
                 f.write("-" * 30 + "\n")
                 f.write(f"Total Pairs: {stats['total_pairs']}\n")
+                if self.respondents is not None and len(self.respondents) > 0:
+                    paired = stats['total_pairs'] * 2
+                    f.write(f"Participants Paired: {paired} of {len(self.respondents)} "
+                            f"({paired / len(self.respondents):.1%})\n")
                 
                 # Check for division by zero
                 if stats['total_pairs'] > 0:
                     f.write(f"Average Match Quality: {stats['avg_match_quality']:.2%}\n")
                 else:
                     f.write("Average Match Quality: N/A (no pairs)\n")
+                f.write(f"Total Match Quality: {stats['total_match_quality']:.2f}\n")
+                if 'runtime' in stats:
+                    f.write(f"Matching Time: {stats['runtime']:.3f}s\n")
                 
                 if stats.get('grade_differences'):
                     f.write("\nGrade Distribution:\n")
@@ -111,5 +126,11 @@ class MatchAnalysis:
             if results:
                 best_quality = max(results.items(), key=lambda x: x[1]['avg_match_quality'])
                 f.write(f"Best average match quality: {best_quality[0]} ({best_quality[1]['avg_match_quality']:.2%})\n")
+                best_total = max(results.items(), key=lambda x: x[1]['total_match_quality'])
+                f.write(f"Best total match quality: {best_total[0]} ({best_total[1]['total_match_quality']:.2f})\n")
+                timed = [(name, stats['runtime']) for name, stats in results.items() if 'runtime' in stats]
+                if timed:
+                    fastest = min(timed, key=lambda x: x[1])
+                    f.write(f"Fastest matching: {fastest[0]} ({fastest[1]:.3f}s)\n")
             else:
                 f.write("No algorithm results available for comparison\n")
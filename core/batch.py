@@ -0,0 +1,1244 @@
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import itemgetter
+from typing import Dict
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+from core.analysis import MatchAnalysis
+from core.blossom import max_weight_matching
+from core.defaults import RECOMMENDED_GRADE_WEIGHT, MAX_GRADE_DIFFERENCE, MIN_MATCH_QUALITY
+from core.FixCSV import load_replacements
+from core.incremental import (
+    save_state, load_state, state_path, survey_change, merge_new_rows,
+    restricted_ranks, pair_costs, best_new_costs
+)
+from core.matching import RankIndex
+from core.pipeline import (
+    read_csv_rows, apply_replacements, write_through, with_distance_features,
+    collect_features, ranked_rows, store_ranked_blocks, StageProgress, count_lines
+)
+from core.rankstore import RankLists, NO_MATCHES, save_rank_lists
+from core.report import RunReport, peak_rss_mb, similarity_list_reduction
+from core.respondents import NO_GRADE, RespondentTable, survey_records
+from core.Ski import calculate_similarity, iter_ranked_blocks, block_size_for_memory, DEFAULT_SIMILARITY_ENGINE
+from utils.file_handlers import write_csv_rows
+
+# The survey-to-pairs stages behind main.py, pygameMain.py and core.cli.
+# Nothing here imports a GUI toolkit, so all three run the same code.
+
+# Detect if running as bundled application
+IS_BUNDLED = getattr(sys, 'frozen', False)
+
+def purge_genR_folder():
+    """Purge and recreate the genR folder in core directory"""
+    output_dir = os.path.join(os.path.dirname(__file__), "genR")
+    if (os.path.exists(output_dir)):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+def prefilter_by_preferences(similarity_rows, emails, respondents, top_k=None):
+    """Remove incompatible matches using more lenient preference filtering
+
+    similarity_rows yields (respondent id, ranked candidate ids) and may be a
+    generator, so the unfiltered lists never have to be held in memory.
+    Returns filtered RankLists over emails; an empty list stands for
+    "No matches found". With top_k set, at most top_k compatible matches are
+    kept per person.
+    """
+    print("\n=== Starting Preference Filtering ===")
+    
+    gender_prefs = respondents.gender_preferences()
+    print(f"Loaded {len(gender_prefs)} participant preferences")
+    
+    # Preference data per id of the rank lists
+    people = [gender_prefs.get(email) for email in emails]
+    accepts, wants_codes, gender_codes = compile_compatibility(people)
+    print(f"Compiled {accepts.shape[0] - 1} preference x {accepts.shape[1] - 1} gender compatibility table")
+    
+    owners = []
+    filtered_ids = []
+    entries = 0
+    
+    for person, candidates in similarity_rows:
+        entries += 1
+        if wants_codes[person] < 0:
+            continue
+        
+        # More lenient compatibility check, for the whole row at once
+        candidates = np.asarray(candidates)
+        matches = candidates[accepts[wants_codes[person], gender_codes[candidates]]]
+        if top_k is not None:
+            matches = matches[:top_k]
+        
+        owners.append(person)
+        filtered_ids.append(matches)
+    
+    print(f"Found {entries} original entries")
+    return RankLists.from_id_lists(emails, owners, filtered_ids)
+
+def check_compatibility(person1, person2):
+    """Check if two people are compatible using more lenient rules"""
+    # Handle multiple preferences
+    def parse_preferences(pref):
+        if isinstance(pref, str):
+            prefs = [p.strip() for p in pref.split(',')]
+            return [p for p in prefs if p]
+        return [str(pref)]
+    
+    person1_wants = parse_preferences(person1["wants"])
+    person2_gender = person2["gender"]
+    
+    # More lenient compatibility rules
+    compatible = (
+        "No Preference" in person1_wants or
+        "5" in person1_wants or  # Accepts both genders
+        person2_gender in person1_wants or
+        any(p.lower() == person2_gender.lower() for p in person1_wants)
+    )
+    
+    return compatible
+
+def compile_compatibility(people):
+    """Compile check_compatibility into a table over preference and gender codes
+
+    people holds a {"gender", "wants"} dict, or None, per id. Each distinct
+    value is checked once, so the table is tiny. Returns (accepts,
+    wants_codes, gender_codes): a accepts b when
+    accepts[wants_codes[a], gender_codes[b]]. Ids without data get code -1,
+    which lands on an all-False last row and column.
+    """
+    wants_values = {}
+    gender_values = {}
+    for person in people:
+        if person:
+            wants_values.setdefault(person["wants"], len(wants_values))
+            gender_values.setdefault(person["gender"], len(gender_values))
+    
+    accepts = np.zeros((len(wants_values) + 1, len(gender_values) + 1), dtype=bool)
+    for wants, i in wants_values.items():
+        for gender, j in gender_values.items():
+            accepts[i, j] = check_compatibility({"wants": wants}, {"gender": gender})
+    
+    wants_codes = np.array([wants_values[p["wants"]] if p else -1 for p in people], dtype=np.int64)
+    gender_codes = np.array([gender_values[p["gender"]] if p else -1 for p in people], dtype=np.int64)
+    return accepts, wants_codes, gender_codes
+
+def compatibility_buckets(people):
+    """(row_codes, code_columns) grouping people by preference code
+
+    Each preference group lists the ids whose gender it accepts, so stage 3
+    can score a group against those columns only.
+    """
+    accepts, wants_codes, gender_codes = compile_compatibility(people)
+    code_columns = [np.flatnonzero(accepts[code, gender_codes]) for code in range(accepts.shape[0] - 1)]
+    return wants_codes, code_columns
+
+def create_pairs(ranks, quality_weight=0.5, verbose=False):
+    """Create pairs from similarity data with preference validation
+
+    ranks is the RankIndex of the similarity lists; pairing runs on email
+    ids and emails only come back for printing and the returned pairs.
+    verbose prints every candidate considered.
+    """
+    print("\nStarting pairing process...")
+    
+    emails = ranks.ids.emails
+    lengths = ranks.lengths
+    owners = [owner for owner in ranks.owner_ids.tolist() if lengths[owner]]
+    for owner in owners:
+        print(f"  {emails[owner]} has {lengths[owner]} potential matches")
+    
+    pairs = []
+    used = np.zeros(len(ranks), dtype=bool)
+    
+    participants = sorted(owners, key=lambda owner: lengths[owner])
+    
+    print(f"\nProcessing {len(participants)} participants...")
+    
+    for person in participants:
+        if used[person]:
+            continue
+            
+        print(f"\nProcessing {emails[person]}")
+        print(f"  Has {lengths[person]} potential matches")
+        
+        available = ~used[ranks.candidates_of(person)]
+        potential_matches = ranks.candidates_of(person)[available]
+        match_scores = 1.0 - (ranks.positions_of(person)[available] / lengths[person])
+        reverse_positions = ranks.position(potential_matches, person)
+        mutual = reverse_positions >= 0
+        reverse_scores = 1.0 - (reverse_positions / np.maximum(lengths[potential_matches], 1))
+        scores = np.where(mutual, (match_scores + reverse_scores) / 2, -1.0)
+        
+        if verbose:
+            for match, is_mutual, score in zip(potential_matches.tolist(), mutual.tolist(), scores.tolist()):
+                if is_mutual:
+                    print(f"    Checking {emails[match]} - mutual match with score {score:.2f}")
+                else:
+                    print(f"    Skipping {emails[match]} - not a mutual match")
+        
+        if mutual.any():
+            best = int(np.argmax(scores))
+            best_match, best_score = int(potential_matches[best]), float(scores[best])
+            print(f"  ✓ Matched with {emails[best_match]} (score: {best_score:.2f})")
+            pairs.append([emails[person], emails[best_match], best_score])
+            used[person] = True
+            used[best_match] = True
+        else:
+            print(f"  ✗ No valid match found")
+    
+    print(f"\nCreated {len(pairs)} valid pairs")
+    return pairs
+
+def sorted_members(ranks):
+    """(ids, row of each id) for everyone in ranks, rows in email order
+
+    Ids outside ranks get row -1.
+    """
+    ids = ranks.ids.sorted_ids(ranks.members().tolist())
+    row_of = np.full(len(ranks), -1, dtype=np.int64)
+    row_of[ids] = np.arange(len(ids))
+    return ids, row_of
+
+def use_sparse_assignment(cells, n):
+    """Whether an n x n assignment with this many listed cells is solved sparsely"""
+    return cells <= SPARSE_ASSIGNMENT_MAX_DENSITY * n * n
+
+def dense_assignment(cost_matrix, unlisted_cost):
+    """linear_sum_assignment over cost_matrix, whose unlisted cells cost unlisted_cost
+
+    Returns the rows assigned to listed cells, their columns and those cells' costs.
+    """
+    row_ind, col_ind = linear_sum_assignment(cost_matrix)
+    costs = cost_matrix[row_ind, col_ind]
+    listed = costs != unlisted_cost
+    return row_ind[listed], col_ind[listed], costs[listed]
+
+def sparse_assignment(lo, hi, costs, n, unlisted_cost):
+    """dense_assignment for the symmetric n x n matrix with costs at (lo, hi)
+    and (hi, lo) and unlisted_cost everywhere else, without building it
+
+    Each (lo, hi) appears once. Every row also gets a column of its own at
+    unlisted_cost, which stands for all its unlisted cells: a dense solve
+    only puts rows there once no listed cell is worth taking, so both find
+    equally cheap assignments. Memory is O(listed cells) instead of O(n^2).
+    """
+    mirrored = lo != hi
+    own = np.arange(n)
+    rows = np.concatenate([lo, hi[mirrored], own])
+    cols = np.concatenate([hi, lo[mirrored], n + own])
+    values = np.concatenate([costs, costs[mirrored], np.full(n, unlisted_cost)])
+    
+    # Every row is matched exactly once, so adding one to every cost changes
+    # no choice and keeps zero costs from being read as missing cells
+    graph = csr_matrix((values + 1.0, (rows, cols)), shape=(n, 2 * n))
+    row_ind, col_ind = min_weight_full_bipartite_matching(graph)
+    listed = col_ind < n
+    row_ind, col_ind = row_ind[listed], col_ind[listed]
+    if not len(row_ind):
+        return row_ind, col_ind, np.empty(0)
+    
+    # Costs of the chosen cells as given, rather than shifted and back
+    entry = csr_matrix((np.arange(1, len(values) + 1), (rows, cols)), shape=(n, 2 * n))
+    chosen = np.asarray(entry[row_ind, col_ind]).ravel() - 1
+    return row_ind, col_ind, values[chosen]
+
+def hungarian_cells(ranks, row_of):
+    """Listed cells of the Hungarian cost matrix as (lo, hi, costs), lo <= hi:
+    the lower of the two list positions, as a fraction of the list length"""
+    owners = ranks.edge_owners
+    i, j = row_of[owners], row_of[ranks.candidates]
+    costs = ranks.positions / np.maximum(ranks.lengths[owners], 1)
+    lo, hi = np.minimum(i, j), np.maximum(i, j)
+    order = np.lexsort((costs, hi, lo))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (lo[order][1:] != lo[order][:-1]) | (hi[order][1:] != hi[order][:-1])
+    lowest = order[first]
+    return lo[lowest], hi[lowest], costs[lowest]
+
+def create_hungarian_pairs(ranks, quality_weight=0.5, members=None):
+    """Create optimal pairs using modified Hungarian algorithm
+
+    members is sorted_members(ranks), if it was already built.
+    """
+    print("\nStarting Hungarian matching process...")
+    
+    # Everyone in the lists, in email order
+    member_ids, row_of = members if members is not None else sorted_members(ranks)
+    emails = ranks.ids.lookup(member_ids.tolist())
+    n = len(emails)
+    
+    if use_sparse_assignment(2 * len(ranks.edge_owners), n):
+        lo, hi, costs = hungarian_cells(ranks, row_of)
+        row_ind, col_ind, costs = sparse_assignment(lo, hi, costs, n, UNLISTED_HUNGARIAN_COST)
+    else:
+        # Initialize cost matrix with high costs
+        cost_matrix = np.full((n, n), UNLISTED_HUNGARIAN_COST)
+        
+        # Convert position to cost (earlier positions = lower cost)
+        owners = ranks.edge_owners
+        cost_matrix[row_of[owners], row_of[ranks.candidates]] = ranks.positions / np.maximum(ranks.lengths[owners], 1)
+        
+        # Make matrix symmetric
+        cost_matrix = np.minimum(cost_matrix, cost_matrix.T)
+        
+        # Run Hungarian algorithm
+        row_ind, col_ind, costs = dense_assignment(cost_matrix, UNLISTED_HUNGARIAN_COST)
+    
+    # Create pairs
+    pairs = []
+    used = np.zeros(n, dtype=bool)
+    
+    for i, j, cost in zip(row_ind.tolist(), col_ind.tolist(), costs.tolist()):
+        if not used[i] and not used[j]:
+            quality = 1.0 - cost
+            pairs.append([emails[i], emails[j], quality])
+            used[i] = True
+            used[j] = True
+    
+    print(f"Created {len(pairs)} pairs")
+    return pairs
+
+def create_blossom_pairs(ranks, quality_weight=0.5, members=None):
+    """Create optimal pairs with maximum-weight matching on the compatibility graph
+
+    Pair quality is the same as in create_hungarian_pairs (the better of the
+    two list positions), but people are matched to each other directly, so
+    memory is O(compatible pairs) and no assignment has to be thrown away
+    afterwards. members is sorted_members(ranks), if it was already built.
+    """
+    print("\nStarting blossom matching process...")
+    
+    member_ids, row_of = members if members is not None else sorted_members(ranks)
+    emails = ranks.ids.lookup(member_ids.tolist())
+    n = len(emails)
+    
+    owners = ranks.edge_owners
+    i = row_of[owners]
+    j = row_of[ranks.candidates]
+    costs = ranks.positions / np.maximum(ranks.lengths[owners], 1)
+    distinct = i != j
+    i, j, costs = i[distinct], j[distinct], costs[distinct]
+    
+    # Lowest cost of each unordered pair over both lists, with the pairs in
+    # the order they are first met
+    keys = np.minimum(i, j) * n + np.maximum(i, j)
+    by_cost = np.lexsort((costs, keys))
+    lowest = np.ones(len(by_cost), dtype=bool)
+    lowest[1:] = keys[by_cost][1:] != keys[by_cost][:-1]
+    pair_keys = keys[by_cost][lowest]
+    pair_costs = costs[by_cost][lowest]
+    _, first_seen = np.unique(keys, return_index=True)
+    met = np.argsort(first_seen, kind='stable')
+    
+    weights = np.rint((1.0 - pair_costs[met]) * BLOSSOM_WEIGHT_SCALE).astype(np.int64)
+    edges = list(zip((pair_keys[met] // n).tolist(), (pair_keys[met] % n).tolist(), weights.tolist()))
+    print(f"Matching {n} participants over {len(edges)} compatible pairs")
+    mate = max_weight_matching(n, edges)
+    
+    pairs = []
+    for a, b in enumerate(mate):
+        if b > a:
+            cost = pair_costs[np.searchsorted(pair_keys, a * n + b)]
+            pairs.append([emails[a], emails[b], 1.0 - float(cost)])
+    
+    print(f"Created {len(pairs)} blossom pairs")
+    return pairs
+
+# Similarity engine used in stage 3 ("numpy" or the reference "loop")
+SIMILARITY_ENGINE = DEFAULT_SIMILARITY_ENGINE
+# Memory budget for stage 3 in MiB, used when a front end passes none; when
+# set, the distance blocks are sized to fit it instead of SIMILARITY_BLOCK_SIZE rows
+SIMILARITY_MAX_MEMORY_MB = None
+# Also write similarity_list.csv / filtered_similarity_list.csv next to the binary rank stores
+EXPORT_INTERMEDIATE_CSV = False
+# Write modified_csv.csv, processed_distances.csv and the rank stores as the
+# pipeline streams through them; no stage reads them back
+SAVE_INTERMEDIATE_FILES = True
+# Score each respondent only against the genders they accept, so top-K
+# lists hold K compatible candidates; the unfiltered similarity_list is then
+# not written
+BUCKETED_SIMILARITY = True
+# Also pair with sparse maximum-weight matching, saved to core/genR/blossom.
+# Off by default: the matcher is pure Python and holds the GIL, so it cannot
+# overlap the other matchers and takes longer than all of them together
+# (about 2-4 s of stage 5 at 700 respondents, 24 s at 10,000 with top-K 25).
+# Default for runs that do not pass blossom (core.cli --blossom, or the GUI's
+# Blossom checkbox)
+ENABLE_BLOSSOM_MATCHING = False
+# Blossom edge weights are integers; qualities are kept to this resolution
+BLOSSOM_WEIGHT_SCALE = 1000000
+# Solve the grade-sensitive (sgluttony) assignment per grade band rather
+# than over everyone at once: much faster on school-wide surveys, at a small
+# cost in pair quality (see grade_banded_pairs). Default for runs that do not
+# pass grade_banded (core.cli --grade-banded, or the GUI's checkbox)
+GRADE_BANDED_MATCHING = False
+# Threads stage 5 runs its matchers on; 1 runs them one after another. The
+# Hungarian variants each hold an n x n matrix, so concurrent runs also
+# raise peak memory
+MATCHING_THREADS = os.cpu_count() or 1
+# Hungarian assignments with at most this fraction of their n x n cells
+# listed are solved on a sparse matrix of the listed cells only; denser ones
+# (full lists) on the dense matrix, where linear_sum_assignment is faster
+SPARSE_ASSIGNMENT_MAX_DENSITY = 0.1
+# Save what core/genR/incremental needs for run_incremental_pipeline to
+# match responses added later without redoing every stage
+SAVE_INCREMENTAL_STATE = True
+# Processes used by stage 3; the output is the same for any worker count
+SIMILARITY_WORKERS = 1 if IS_BUNDLED else (os.cpu_count() or 1)
+# Penalty by grade difference in the grade-sensitive costs, indexed by
+# min(difference, 3); the grade score of a pair is 1 - penalty
+GRADE_PENALTIES = np.array([
+    0.0,    # Same grade
+    0.2,    # One grade difference
+    0.6,    # Two grades difference
+    1.0,    # Three+ grades difference
+])
+
+def grade_penalties(grades1, grades2):
+    """GRADE_PENALTIES for arrays of grades, elementwise"""
+    difference = np.minimum(np.abs(grades1 - grades2), len(GRADE_PENALTIES) - 1)
+    return GRADE_PENALTIES[difference]
+
+def calculate_grade_difference(grade1: int, grade2: int) -> str:
+    """Calculate and format the grade difference between two students"""
+    if grade1 is None or grade2 is None:
+        return "N/A"
+    return str(abs(grade1 - grade2))
+
+# Edges whose costs are computed together when filling the grade-sensitive
+# cost matrix; bounds the temporaries for surveys with full lists
+GRADE_COST_CHUNK_EDGES = 1 << 20
+# Costs of a pair neither list contains in the Hungarian and the
+# grade-sensitive assignments
+UNLISTED_HUNGARIAN_COST = 1000.0
+UNLISTED_GRADE_COST = 999999.0
+
+def listed_edges(ranks, row_of):
+    """(owners, candidates, positions) of the edges between ids with rows, in
+    edge order, GRADE_COST_CHUNK_EDGES edges at a time"""
+    for start in range(0, len(ranks.edge_owners), GRADE_COST_CHUNK_EDGES):
+        chunk = slice(start, start + GRADE_COST_CHUNK_EDGES)
+        owners, candidates = ranks.edge_owners[chunk], ranks.candidates[chunk]
+        listed = (row_of[owners] >= 0) & (row_of[candidates] >= 0)
+        yield owners[listed], candidates[listed], ranks.positions[chunk][listed]
+
+def grade_edge_costs(ranks, owners, candidates, positions, grades, grade_weight):
+    """Grade-sensitive cost of each (owner, candidate) edge"""
+    # Base compatibility score (inverse of position)
+    base_score = 1.0 - (positions / ranks.lengths[owners])
+    
+    # Grade score, 1.0 if either grade is unknown
+    grades1, grades2 = grades[owners], grades[candidates]
+    known = (grades1 != NO_GRADE) & (grades2 != NO_GRADE)
+    grade_score = np.where(known, 1.0 - grade_penalties(grades1, grades2), 1.0)
+    
+    # Combine scores with weights; higher score = lower cost
+    combined_score = ((1 - grade_weight) * base_score +
+                      grade_weight * grade_score)
+    return 1.0 - combined_score
+
+def grade_cost_cells(ranks, row_of, grades, grade_weight):
+    """Listed cells of grade_cost_matrix as (lo, hi, costs), lo <= hi"""
+    chunks = list(listed_edges(ranks, row_of))
+    if not chunks:
+        none = np.empty(0, dtype=np.int64)
+        return none, none, np.empty(0)
+    owners, candidates, positions = (np.concatenate(parts) for parts in zip(*chunks))
+    costs = grade_edge_costs(ranks, owners, candidates, positions, grades, grade_weight)
+    i, j = row_of[owners], row_of[candidates]
+    lo, hi = np.minimum(i, j), np.maximum(i, j)
+    
+    # As in grade_cost_matrix, the edge of the later owner sets both cells
+    order = np.lexsort((ranks.starts[owners], hi, lo))
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (lo[order][1:] != lo[order][:-1]) | (hi[order][1:] != hi[order][:-1])
+    latest = order[last]
+    return lo[latest], hi[latest], costs[latest]
+
+def grade_cost_matrix(ranks, row_of, n, grades, grade_weight):
+    """n x n grade-sensitive costs over the rows row_of gives the ids of ranks
+
+    Ids without a row (-1) are left out. Cells of unlisted pairs stay at
+    UNLISTED_GRADE_COST.
+    """
+    # Initialize cost matrix with maximum values
+    cost_matrix = np.full((n, n), UNLISTED_GRADE_COST)
+    cells = cost_matrix.ravel()
+    
+    for owners, candidates, positions in listed_edges(ranks, row_of):
+        costs = grade_edge_costs(ranks, owners, candidates, positions, grades, grade_weight)
+        cells[row_of[owners] * n + row_of[candidates]] = costs
+    
+    # Make cost matrix symmetric. Each edge's cost also goes to the mirrored
+    # cell, except when the reverse edge is listed too and comes later in
+    # edge order (a later owner): then the later edge's cost takes both cells
+    for owners, candidates, _ in listed_edges(ranks, row_of):
+        forward = row_of[owners] * n + row_of[candidates]
+        mirrored = row_of[candidates] * n + row_of[owners]
+        reverse_listed = cells[mirrored] != UNLISTED_GRADE_COST
+        wins = ~reverse_listed | (ranks.starts[candidates] < ranks.starts[owners])
+        cells[mirrored[wins]] = cells[forward[wins]]
+    
+    return cost_matrix
+
+def grade_sensitive_assignment(ranks, owner_ids, grade_data: Dict[str, int], grades, grade_weight: float):
+    """One Hungarian assignment over owner_ids (ids in email order)
+
+    Returns the kept pairs as create_grade_sensitive_pairs lists them,
+    unsorted, and for each pair the positions in owner_ids of its two members.
+    """
+    emails = ranks.ids.lookup(owner_ids.tolist())
+    n = len(emails)
+    row_of = np.full(len(ranks), -1, dtype=np.int64)
+    row_of[owner_ids] = np.arange(n)
+    
+    listed = sum(len(owners) for owners, _, _ in listed_edges(ranks, row_of))
+    if use_sparse_assignment(2 * listed, n):
+        lo, hi, costs = grade_cost_cells(ranks, row_of, grades, grade_weight)
+        row_ind, col_ind, costs = sparse_assignment(lo, hi, costs, n, UNLISTED_GRADE_COST)
+    else:
+        cost_matrix = grade_cost_matrix(ranks, row_of, n, grades, grade_weight)
+        
+        # Run Hungarian algorithm
+        row_ind, col_ind, costs = dense_assignment(cost_matrix, UNLISTED_GRADE_COST)
+    
+    # Create pairs
+    pairs = []
+    rows = []
+    used = np.zeros(n, dtype=bool)
+    
+    for i, j, cost in zip(row_ind.tolist(), col_ind.tolist(), costs.tolist()):
+        if not used[i] and not used[j]:
+            email1, email2 = emails[i], emails[j]
+            
+            # Calculate quality score (inverse of cost)
+            quality = 1.0 - cost
+            
+            # Skip pairs with very low quality
+            if quality < MIN_MATCH_QUALITY:
+                continue
+                
+            grade1 = grade_data.get(email1)
+            grade2 = grade_data.get(email2)
+            grade_diff = calculate_grade_difference(grade1, grade2)
+            
+            # Skip pairs with too large grade difference
+            if grade_diff.isdigit() and int(grade_diff) > MAX_GRADE_DIFFERENCE:
+                continue
+                
+            grade_info = f" (grades: {grade1}, {grade2})"
+            
+            pairs.append([email1, email2, quality, grade_info, grade_diff])
+            rows.append((i, j))
+            used[i] = True
+            used[j] = True
+    
+    return pairs, np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+def grade_bands(known_grades):
+    """Windows of MAX_GRADE_DIFFERENCE + 1 adjacent grades, one starting at
+    each grade present, lowest first, up to the first reaching the top grade"""
+    bands = []
+    for grade in known_grades:
+        bands.append((grade, grade + MAX_GRADE_DIFFERENCE))
+        if grade + MAX_GRADE_DIFFERENCE >= known_grades[-1]:
+            break
+    return bands
+
+def grade_banded_pairs(ranks, owner_ids, grade_data: Dict[str, int], grades, grade_weight: float):
+    """Grade-sensitive pairs from several small assignments instead of one
+
+    Pairs more than MAX_GRADE_DIFFERENCE grades apart are never kept, and the
+    grade penalty makes most pairs same-grade or one grade apart. So the
+    grades present are swept two adjacent grades at a time, lowest first:
+    each band keeps the pairs with someone of its lower grade, whose last
+    chance it is, and hands everyone else on to the next band. Whoever is
+    still unpaired is then matched in the wider, overlapping grade_bands.
+    Respondents without a grade join every band. This can pair less well
+    than one assignment over everyone; testing/BenchmarkGradeBands.py
+    measures by how much.
+    """
+    owner_grades = grades[owner_ids]
+    ungraded = owner_grades == NO_GRADE
+    waiting = np.ones(len(owner_ids), dtype=bool)
+    pairs = []
+    
+    def assign(band, keep=None):
+        """Match the waiting members of band; keep(rows) picks the pairs kept (all by default)"""
+        members = np.flatnonzero(band & waiting)
+        if len(members) < 2:
+            return
+        found, rows = grade_sensitive_assignment(ranks, owner_ids[members], grade_data, grades, grade_weight)
+        rows = members[rows]
+        kept = keep(rows) if keep is not None else np.ones(len(found), dtype=bool)
+        pairs.extend(pair for pair, k in zip(found, kept.tolist()) if k)
+        waiting[rows[kept].ravel()] = False
+    
+    known_grades = np.unique(owner_grades[~ungraded]).tolist()
+    if len(known_grades) < 2:
+        assign(waiting.copy())
+        return pairs
+    
+    for low, high in zip(known_grades, known_grades[1:]):
+        band = ungraded | (owner_grades == low) | (owner_grades == high)
+        if high == known_grades[-1]:
+            assign(band)
+        else:
+            assign(band, lambda rows: (owner_grades[rows] == low).any(axis=1))
+    
+    for low, high in grade_bands(known_grades):
+        assign(ungraded | ((owner_grades >= low) & (owner_grades <= high)))
+    
+    return pairs
+
+def create_grade_sensitive_pairs(ranks, grade_data: Dict[str, int], grade_weight: float = RECOMMENDED_GRADE_WEIGHT,
+                                 grades=None, banded=None):
+    """Create pairs considering both compatibility and grade
+
+    grades holds the grade of every id in ranks (NO_GRADE if unknown); it is
+    built from grade_data when not given. banded (GRADE_BANDED_MATCHING by
+    default) solves per grade band with grade_banded_pairs.
+    """
+    if banded is None:
+        banded = GRADE_BANDED_MATCHING
+    print(f"\nStarting grade-sensitive Hungarian matching{' by grade band' if banded else ''}...")
+    
+    # List owners in email order
+    owner_ids = ranks.ids.sorted_ids(ranks.owner_ids.tolist())
+    if grades is None:
+        grades = np.array([grade_data.get(email, NO_GRADE) for email in ranks.ids.emails], dtype=np.int64)
+    
+    if banded:
+        pairs = grade_banded_pairs(ranks, owner_ids, grade_data, grades, grade_weight)
+    else:
+        pairs, _ = grade_sensitive_assignment(ranks, owner_ids, grade_data, grades, grade_weight)
+    
+    # Sort pairs by quality
+    pairs.sort(key=lambda x: float(x[2]), reverse=True)
+    
+    print(f"Created {len(pairs)} grade-sensitive pairs")
+    return pairs
+
+def run_matchers(matchers, timings, progress):
+    """Run {name: (create, *args)} and return {name: pairs}
+
+    With MATCHING_THREADS > 1 the matchers run concurrently; the Hungarian
+    solver and the numpy work release the GIL, so the stage takes about as
+    long as its slowest matcher. timings gets each matcher's seconds and
+    progress(done, total) is called on this thread as each one finishes.
+    """
+    def timed(name):
+        create, *args = matchers[name]
+        start = time.perf_counter()
+        pairs = create(*args)
+        return pairs, time.perf_counter() - start
+
+    results = {}
+    def finish(name, outcome):
+        results[name], timings[name] = outcome
+        progress(len(results), len(matchers))
+
+    workers = min(MATCHING_THREADS, len(matchers))
+    if workers <= 1:
+        for name in matchers:
+            finish(name, timed(name))
+        return results
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="matcher")
+    try:
+        futures = {executor.submit(timed, name): name for name in matchers}
+        for future in as_completed(futures):
+            finish(futures[future], future.result())
+    finally:
+        # A failed or cancelled stage does not wait for the other matchers
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def pair_output_dirs(blossom=False):
+    """Output folder of each algorithm under core/genR, created if missing
+
+    blossom adds the blossom folder.
+    """
+    algorithm_dirs = {
+        'greed': os.path.join(os.path.dirname(__file__), "genR", "greed"),
+        'gluttony': os.path.join(os.path.dirname(__file__), "genR", "gluttony"),
+        'sgreed': os.path.join(os.path.dirname(__file__), "genR", "sgreed"),
+        'sgluttony': os.path.join(os.path.dirname(__file__), "genR", "sgluttony")
+    }
+    
+    if blossom:
+        algorithm_dirs['blossom'] = os.path.join(os.path.dirname(__file__), "genR", "blossom")
+    
+    # Create directories if they don't exist
+    for dir_path in algorithm_dirs.values():
+        os.makedirs(dir_path, exist_ok=True)
+    return algorithm_dirs
+
+def create_optimal_pairs(filtered_ranks, respondents, quality_weight=0.5, grade_weight=RECOMMENDED_GRADE_WEIGHT, top_k=None, timings=None, progress=None, blossom=None, grade_banded=None):
+    """Create optimal pairs using both algorithms with grade consideration
+
+    filtered_ranks are the RankLists produced by stage 4. With top_k set, only
+    the top_k candidates of each list are considered. If a timings dict is
+    given, the seconds taken by each algorithm are stored in it by folder name.
+    progress(done, total) is called as each algorithm finishes. blossom
+    (ENABLE_BLOSSOM_MATCHING by default) also runs create_blossom_pairs;
+    grade_banded is passed to create_grade_sensitive_pairs as banded.
+    Returns the pairs of each algorithm by folder name.
+    """
+    if blossom is None:
+        blossom = ENABLE_BLOSSOM_MATCHING
+    if timings is None:
+        timings = {}
+    if progress is None:
+        progress = lambda done, total: None
+    print("Creating optimal pairs using multiple algorithms...")
+    
+    # Create algorithm-specific output directories
+    algorithm_dirs = pair_output_dirs(blossom)
+    
+    # Built once and shared by every matcher: emails interned to ids, and
+    # everyone's row in email order for the Hungarian and blossom variants
+    ranks = RankIndex.from_rank_lists(filtered_ranks, top_k)
+    members = sorted_members(ranks)
+    # Grade data was loaded with the respondent table
+    grade_data = respondents.grade_map()
+    grades = respondents.grade_vector(ranks.ids.emails)
+    
+    print(f"Read {len(filtered_ranks)} entries from similarity store")
+    
+    matchers = {
+        'greed': (create_pairs, ranks, quality_weight),
+        'gluttony': (create_hungarian_pairs, ranks, quality_weight, members),
+        'sgluttony': (create_grade_sensitive_pairs, ranks, grade_data, grade_weight, grades, grade_banded),
+    }
+    if blossom:
+        matchers['blossom'] = (create_blossom_pairs, ranks, quality_weight, members)
+    results = run_matchers(matchers, timings, lambda done, total: progress(done, total + 1))
+    # sgreed has exactly greed's inputs, so greed's pairs are reused rather
+    # than computed twice
+    results['sgreed'] = results['greed']
+    timings['sgreed'] = timings['greed']
+    progress(len(results), len(results))
+    
+    write_pair_outputs(results, respondents, grade_data, algorithm_dirs)
+    return results
+
+def write_pair_outputs(results, respondents, grade_data, algorithm_dirs):
+    """Write each algorithm's optimal_pairs.csv, enriched pairs and unpaired participants"""
+    # Rows of each optimal_pairs.csv: the plain algorithms add the grade
+    # difference, the grade-sensitive ones are written as returned
+    def with_grade_difference(pairs):
+        return [[email1, email2, quality, calculate_grade_difference(grade_data.get(email1), grade_data.get(email2))]
+                for email1, email2, quality in pairs]
+    
+    plain = [algo for algo in ('greed', 'gluttony', 'blossom') if algo in results]
+    pair_rows = {algo: with_grade_difference(results[algo]) for algo in plain}
+    for algo in plain:
+        write_csv_rows(os.path.join(algorithm_dirs[algo], "optimal_pairs.csv"), pair_rows[algo],
+                       header=["Person 1", "Person 2", "Match Quality", "Grade Difference"])
+    
+    # Save grade-sensitive pairs
+    for suffix in ("sgreed", "sgluttony"):
+        pair_rows[suffix] = results[suffix]
+        write_csv_rows(os.path.join(algorithm_dirs[suffix], "optimal_pairs.csv"), pair_rows[suffix],
+                       header=["Person 1", "Person 2", "Match Quality", "Grade Info", "Grade Difference"])
+        
+        # Create enriched versions
+        enrich_optimal_pairs(pair_rows[suffix], respondents, grade_data, suffix=suffix, include_grades=True)
+    
+    # Find and save unpaired participants for all algorithms, then the
+    # enriched versions, straight from the pairs in memory
+    for algo, rows in pair_rows.items():
+        unpaired = find_unpaired_participants(rows, respondents)
+        save_unpaired_info(unpaired, respondents, suffix=f"_{algo}", output_dir=algorithm_dirs[algo])
+    for algo, rows in pair_rows.items():
+        enrich_optimal_pairs(rows, respondents, grade_data, suffix="", output_dir=algorithm_dirs[algo])
+
+def rescore_pairs(algo, ranks, rows, grade_data, grades, grade_weight):
+    """Earlier pairs of algo scored on ranks the way the algorithm scores them
+
+    Returns the re-scored rows, a mask of the pairs the algorithm could still
+    make (listed as it requires and within its cut-offs) and the ids of both
+    partners.
+    """
+    a = np.array([ranks.ids.get(row[0]) for row in rows], dtype=np.int64)
+    b = np.array([ranks.ids.get(row[1]) for row in rows], dtype=np.int64)
+    position_ab, position_ba = ranks.position(a, b), ranks.position(b, a)
+    listed_ab, listed_ba = position_ab >= 0, position_ba >= 0
+    
+    if algo == 'greed':
+        # Mean of both list scores, for mutual matches only
+        holds = listed_ab & listed_ba
+        qualities = ((1.0 - position_ab / np.maximum(ranks.lengths[a], 1)) +
+                     (1.0 - position_ba / np.maximum(ranks.lengths[b], 1))) / 2
+    elif algo == 'sgluttony':
+        costs = np.full(len(rows), np.inf)
+        costs[listed_ab] = grade_edge_costs(ranks, a[listed_ab], b[listed_ab], position_ab[listed_ab],
+                                            grades, grade_weight)
+        # As in grade_cost_matrix, the later owner's edge counts when both list the other
+        use_ba = listed_ba & (~listed_ab | (ranks.starts[b] > ranks.starts[a]))
+        costs[use_ba] = grade_edge_costs(ranks, b[use_ba], a[use_ba], position_ba[use_ba], grades, grade_weight)
+        qualities = 1.0 - costs
+        grade_diffs = [calculate_grade_difference(grade_data.get(row[0]), grade_data.get(row[1])) for row in rows]
+        close_enough = np.array([not (diff.isdigit() and int(diff) > MAX_GRADE_DIFFERENCE) for diff in grade_diffs],
+                                dtype=bool)
+        holds = (listed_ab | listed_ba) & (qualities >= MIN_MATCH_QUALITY) & close_enough
+        rescored = [[row[0], row[1], quality, f" (grades: {grade_data.get(row[0])}, {grade_data.get(row[1])})", diff]
+                    for row, quality, diff in zip(rows, qualities.tolist(), grade_diffs)]
+        return rescored, holds, a, b
+    else:
+        # The better of the two list positions (gluttony, blossom)
+        qualities = 1.0 - pair_costs(ranks, a, b)
+        holds = listed_ab | listed_ba
+    
+    rescored = [[row[0], row[1], quality] for row, quality in zip(rows, qualities.tolist())]
+    return rescored, holds, a, b
+
+def rematch_pairs(algo, ranks, rows, new, changed, quality_weight, grade_data, grades, grade_weight, rematched=None,
+                  grade_banded=None):
+    """Pairs of algo once the respondents in the mask new are in ranks
+
+    An earlier pair (rows) stays, re-scored, unless the algorithm could no
+    longer make it, a new respondent and either partner list each other
+    ahead of the pair, or (for sgluttony) a partner's grade is in the mask
+    changed. Everyone else, new, unpaired or from a broken-up pair, is then
+    matched again by the algorithm among themselves only. rematched, if
+    given, records by algo how many that was; grade_banded is passed to
+    create_grade_sensitive_pairs.
+    """
+    kept_rows, holds, a, b = rescore_pairs(algo, ranks, rows, grade_data, grades, grade_weight)
+    current = pair_costs(ranks, a, b)
+    best_new = best_new_costs(ranks, new)
+    holds &= (best_new[a] >= current) & (best_new[b] >= current)
+    if algo == 'sgluttony':
+        holds &= ~changed[a] & ~changed[b]
+    
+    paired = np.zeros(len(ranks), dtype=bool)
+    paired[a[holds]] = True
+    paired[b[holds]] = True
+    members = ranks.members()
+    affected = members[~paired[members]]
+    affected_ranks = restricted_ranks(ranks, affected)
+    # With nobody new and no grade the algorithm uses changed, the others
+    # were already left over last time; nor can anyone unlisted be paired
+    unchanged = not new.any() and not (algo == 'sgluttony' and changed.any())
+    if unchanged or not len(affected_ranks.edge_owners):
+        affected = affected[:0]
+    if rematched is not None:
+        rematched[algo] = len(affected)
+    print(f"\n{algo}: keeping {int(holds.sum())} pairs, matching {len(affected)} respondents again")
+    
+    if not len(affected):
+        found = []
+    elif algo == 'greed':
+        found = create_pairs(affected_ranks, quality_weight)
+    elif algo == 'gluttony':
+        found = create_hungarian_pairs(affected_ranks, quality_weight)
+    elif algo == 'sgluttony':
+        found = create_grade_sensitive_pairs(affected_ranks, grade_data, grade_weight, grades, grade_banded)
+    else:
+        found = create_blossom_pairs(affected_ranks, quality_weight)
+    
+    pairs = [row for row, kept in zip(kept_rows, holds.tolist()) if kept] + found
+    if algo == 'sgluttony':
+        pairs.sort(key=lambda x: float(x[2]), reverse=True)
+    return pairs
+
+def update_optimal_pairs(filtered_ranks, respondents, previous, new_emails, changed_emails, quality_weight=0.5,
+                         grade_weight=RECOMMENDED_GRADE_WEIGHT, top_k=None, timings=None, progress=None,
+                         rematched=None, grade_banded=None):
+    """create_optimal_pairs for a survey that gained respondents since previous
+
+    previous holds each algorithm's pairs from the last run, by folder name;
+    new_emails are the respondents added since and changed_emails those
+    whose grade changed. Each algorithm keeps what it can of its pairs (see
+    rematch_pairs); grade_banded is passed on to sgluttony. Returns and writes the pairs like create_optimal_pairs.
+    """
+    if timings is None:
+        timings = {}
+    if progress is None:
+        progress = lambda done, total: None
+    print("Updating optimal pairs with the new respondents...")
+    
+    algorithm_dirs = pair_output_dirs('blossom' in previous)
+    ranks = RankIndex.from_rank_lists(filtered_ranks, top_k)
+    grade_data = respondents.grade_map()
+    grades = respondents.grade_vector(ranks.ids.emails)
+    
+    new = np.zeros(len(ranks), dtype=bool)
+    new[[ranks.ids.get(email) for email in new_emails]] = True
+    changed = np.zeros(len(ranks), dtype=bool)
+    changed[[ranks.ids.get(email) for email in changed_emails]] = True
+    
+    matchers = {
+        algo: (rematch_pairs, algo, ranks, rows, new, changed, quality_weight, grade_data, grades, grade_weight,
+               rematched, grade_banded)
+        for algo, rows in previous.items() if algo != 'sgreed'
+    }
+    results = run_matchers(matchers, timings, lambda done, total: progress(done, total + 1))
+    results['sgreed'] = results['greed']
+    timings['sgreed'] = timings['greed']
+    progress(len(results), len(results))
+    
+    write_pair_outputs(results, respondents, grade_data, algorithm_dirs)
+    return results
+
+def enrich_optimal_pairs(pair_rows, respondents, grade_data=None, suffix="", include_grades=False, output_dir=None):
+    """Add gender, preference, and grade difference information to optimal pairs
+
+    pair_rows are the rows of an optimal_pairs.csv, without its header.
+    """
+    if output_dir is None:
+        output_dir = os.path.join(os.path.dirname(__file__), "genR")
+    
+    def pairs_with_info(rows):
+        for row in rows:
+            email1, email2, quality = row[:3]
+            grade_info = row[3] if include_grades and len(row) > 3 else ""
+            grade_diff = row[4] if len(row) > 4 else (
+                calculate_grade_difference(
+                    grade_data.get(email1), grade_data.get(email2)
+                ) if grade_data else "N/A"
+            )
+            
+            gender1, pref1 = respondents.profile(email1)
+            gender2, pref2 = respondents.profile(email2)
+            
+            yield [
+                email1, f"(is: {gender1}, wants: {pref1})",
+                email2, f"(is: {gender2}, wants: {pref2})",
+                quality, grade_info, grade_diff
+            ]
+
+    enriched_file = os.path.join(output_dir, f"optimal_pairs_with_info{suffix}.csv")
+    write_csv_rows(enriched_file, pairs_with_info(pair_rows),
+                   header=["Person 1", "Gender & Preference 1", "Person 2", "Gender & Preference 2", 
+                           "Match Quality", "Grade Info", "Grade Difference"])
+    
+    print(f"Created enriched optimal pairs file in {output_dir}")
+
+def find_unpaired_participants(pair_rows, respondents):
+    """Find participants who weren't matched in pair_rows"""
+    all_participants = set(respondents.emails)
+    
+    paired_participants = set()
+    for row in pair_rows:
+        paired_participants.add(row[0])
+        paired_participants.add(row[1])
+            
+    unpaired = all_participants - paired_participants
+    print(f"Found {len(unpaired)} unpaired participants")
+    return unpaired
+
+def save_unpaired_info(unpaired_participants, respondents, suffix="", output_dir=None):
+    """Create CSV with unpaired participants and their preferences"""
+    if output_dir is None:
+        output_dir = os.path.join(os.path.dirname(__file__), "genR")
+    
+    def unpaired_rows():
+        for email in sorted(unpaired_participants):
+            gender, pref = respondents.profile(email)
+            yield [email, f"(is: {gender}, wants: {pref})"]
+
+    output_file = os.path.join(output_dir, f"unpaired_entries{suffix}.csv")
+    write_csv_rows(output_file, unpaired_rows(), header=["Email", "Gender & Preference"])
+
+def intermediate_path(output_dir, name):
+    """Path of an optional intermediate artifact, or None when they are not saved"""
+    return os.path.join(output_dir, name) if SAVE_INTERMEDIATE_FILES else None
+
+def similarity_block_size(n, max_memory_mb=None):
+    """Rows per stage 3 block: what fits in max_memory_mb (SIMILARITY_MAX_MEMORY_MB
+    if None), or SIMILARITY_BLOCK_SIZE without a budget"""
+    if max_memory_mb is None:
+        max_memory_mb = SIMILARITY_MAX_MEMORY_MB
+    return block_size_for_memory(n, max_memory_mb)
+
+def similarity_blocks(emails, features, top_k=None, buckets=None, max_memory_mb=None):
+    """Yield (start, ranked candidate ids) blocks from the selected similarity engine
+
+    buckets from compatibility_buckets restrict the numpy engine to
+    compatible candidates; max_memory_mb bounds its blocks (see
+    similarity_block_size).
+    """
+    print(f"\nProcessing similarity for {len(emails)} entries ({SIMILARITY_ENGINE} engine)")
+    if SIMILARITY_ENGINE == "numpy":
+        block_size = similarity_block_size(len(emails), max_memory_mb)
+        if buckets is not None:
+            row_codes, code_columns = buckets
+            scored = sum(len(code_columns[code]) for code in row_codes.tolist() if code >= 0)
+            print(f"Scoring {scored} compatible of {len(emails) ** 2} pairs")
+        yield from iter_ranked_blocks(features, block_size, top_k, SIMILARITY_WORKERS, buckets)
+        return
+    data = [[email] + row for email, row in zip(emails, features.tolist())]
+    rank_lists = RankLists.from_rows(calculate_similarity(data, engine=SIMILARITY_ENGINE, top_k=top_k))
+    yield 0, [rank_lists.candidates(i) for i in range(len(rank_lists))]
+
+def save_filtered_lists(output_dir, filtered_ranks, report):
+    """Stage 4: keep the filtered lists in core/genR, as configured"""
+    report.start_stage('save_filtered')
+    filtered_store = intermediate_path(output_dir, "filtered_similarity_list")
+    if filtered_store:
+        save_rank_lists(filtered_store, filtered_ranks)
+    if EXPORT_INTERMEDIATE_CSV:
+        filtered_ranks.write_csv(os.path.join(output_dir, "filtered_similarity_list.csv"))
+    report.end_stage('save_filtered')
+    report.record_artifact('filtered_similarity_list', os.path.join(output_dir, "filtered_similarity_list"))
+    report.record_artifact('filtered_similarity_list.csv', os.path.join(output_dir, "filtered_similarity_list.csv"))
+
+# Stage names shown in the status line, in pipeline order
+PIPELINE_STAGES = [
+    "Reading survey and computing distance features",
+    "Loading respondents and grades",
+    "Computing and filtering similarities",
+    "Saving filtered matches",
+    "Creating optimal pairs",
+]
+# Rows or candidates handled between progress updates (and cancel checks)
+PROGRESS_EVERY_ROWS = 256
+
+def run_pipeline(csv_file, config_file, grade_csv, quality_weight=0.5, grade_weight=RECOMMENDED_GRADE_WEIGHT,
+                 top_k=None, progress=None, max_memory_mb=None, blossom=None, grade_banded=None):
+    """Run every stage from the survey CSV to the analysed pairs in core/genR
+
+    Touches no widgets, so it can run on a worker thread. progress is a
+    StageProgress; its updates are also where a cancelled run stops.
+    max_memory_mb bounds stage 3 (see similarity_block_size), blossom
+    (ENABLE_BLOSSOM_MATCHING by default) adds the blossom pairs and
+    grade_banded (GRADE_BANDED_MATCHING by default) solves sgluttony by
+    grade band. Returns the output directory and the RunReport saved there.
+    """
+    if blossom is None:
+        blossom = ENABLE_BLOSSOM_MATCHING
+    if grade_banded is None:
+        grade_banded = GRADE_BANDED_MATCHING
+    if progress is None:
+        progress = StageProgress(PIPELINE_STAGES, lambda percent, text: None)
+    report = RunReport()
+    report.record('top_k', top_k)
+    report.record('quality_weight', quality_weight)
+    report.record('grade_weight', grade_weight)
+    
+    # Ensure the genR directory exists
+    output_dir = os.path.join(os.path.dirname(__file__), "genR")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    progress.start(0)
+    purge_genR_folder()
+    # Replacement and distance features stream row by row; intermediate
+    # files are written as the rows pass through, never read back
+    rows = progress.track(read_csv_rows(csv_file), count_lines(csv_file), every=PROGRESS_EVERY_ROWS)
+    pairs = apply_replacements(rows, load_replacements(config_file))
+    pairs = write_through(pairs, intermediate_path(output_dir, "modified_csv.csv"), to_row=itemgetter(1))
+    records = with_distance_features(survey_records(pairs))
+    records = write_through(records, intermediate_path(output_dir, "processed_distances.csv"),
+                            to_row=lambda item: [item[0].email] + item[1].tolist())
+    # Barrier: similarity needs every respondent's features at once
+    records, features = collect_features(records)
+    
+    progress.start(1)
+    respondents = RespondentTable.from_records(records)
+    del records
+    respondents.load_grades(grade_csv)
+    
+    progress.start(2)
+    report.start_stage('similarity_and_filtering')
+    emails = respondents.emails
+    n = len(emails)
+    report.record('respondents', n)
+    # Lists are only scored against compatible respondents; they then come
+    # out filtered and there is no unfiltered list to keep
+    bucketed = BUCKETED_SIMILARITY and SIMILARITY_ENGINE == "numpy"
+    buckets = None
+    if bucketed:
+        gender_prefs = respondents.gender_preferences()
+        buckets = compatibility_buckets([gender_prefs.get(email) for email in emails])
+    report.record('bucketed_similarity', bucketed)
+    # Ranked blocks feed the preference filter directly, so the full
+    # similarity lists are only ever on disk, one block at a time
+    # Unbucketed lists are ranked in full and cut to top_k after the
+    # filter, so incompatible candidates never take up top-K places
+    blocks = similarity_blocks(emails, features, top_k if bucketed else None, buckets, max_memory_mb)
+    blocks = progress.track(blocks, n, size=lambda block: len(block[1]))
+    blocks = store_ranked_blocks(blocks, None if bucketed else intermediate_path(output_dir, "similarity_list"),
+                                 emails, max(n - 1, 0))
+    similarity_rows = ranked_rows(blocks)
+    if EXPORT_INTERMEDIATE_CSV and not bucketed:
+        similarity_rows = write_through(
+            similarity_rows, os.path.join(output_dir, "similarity_list.csv"),
+            to_row=lambda item: [emails[item[0]]] + ([emails[j] for j in item[1].tolist()] or [NO_MATCHES]))
+    # Barrier: pairing needs every filtered list
+    filtered_ranks = prefilter_by_preferences(similarity_rows, emails, respondents, top_k=top_k)
+    report.end_stage('similarity_and_filtering')
+    report.record_artifact('similarity_list', os.path.join(output_dir, "similarity_list"))
+    report.record_artifact('similarity_list.csv', os.path.join(output_dir, "similarity_list.csv"))
+    report.record('similarity_list_fraction', similarity_list_reduction(n, top_k))
+    report.record('similarity_workers', SIMILARITY_WORKERS)
+    report.record('similarity_block_size', similarity_block_size(n, max_memory_mb))
+    report.record('peak_rss_mb_after_similarity', peak_rss_mb())
+    
+    progress.start(3)
+    save_filtered_lists(output_dir, filtered_ranks, report)
+    
+    progress.start(4)
+    report.start_stage('pairing')
+    matching_times = {}
+    results = create_optimal_pairs(filtered_ranks, respondents, quality_weight=quality_weight,
+                                   grade_weight=grade_weight, top_k=top_k, timings=matching_times,
+                                   progress=progress.update, blossom=blossom, grade_banded=grade_banded)
+    report.end_stage('pairing')
+    report.record('matching_times', matching_times)
+    report.record('grade_banded_matching', grade_banded)
+    
+    analyzer = MatchAnalysis(output_dir, respondents, matching_times)
+    analyzer.analyze_all_algorithms()
+    if SAVE_INCREMENTAL_STATE:
+        save_state(output_dir, incremental_settings(top_k, quality_weight, grade_weight, blossom, grade_banded),
+                   respondents, features, filtered_ranks, results)
+        report.record_artifact('incremental', state_path(output_dir))
+    report.record('peak_rss_mb', peak_rss_mb())
+    report.save(output_dir)
+    return output_dir, report
+
+def incremental_settings(top_k, quality_weight, grade_weight, blossom, grade_banded):
+    """Settings a run must share with the one whose state it extends"""
+    return {
+        'top_k': top_k,
+        'quality_weight': quality_weight,
+        'grade_weight': grade_weight,
+        'similarity_engine': SIMILARITY_ENGINE,
+        'blossom': blossom,
+        'grade_banded': grade_banded,
+    }
+
+def run_incremental_pipeline(csv_file, config_file, grade_csv, quality_weight=0.5,
+                             grade_weight=RECOMMENDED_GRADE_WEIGHT, top_k=None, progress=None, max_memory_mb=None,
+                             blossom=None, grade_banded=None):
+    """run_pipeline for a survey that only gained rows since the last run
+
+    Only the new respondents are ranked; they are merged into the lists the
+    last run saved (see core.incremental), and each matcher keeps the
+    earlier pairs the newcomers leave standing (see rematch_pairs). Falls
+    back to run_pipeline when there is no saved state, the settings differ
+    or earlier rows changed; the report's incremental entry says which.
+    """
+    if blossom is None:
+        blossom = ENABLE_BLOSSOM_MATCHING
+    if grade_banded is None:
+        grade_banded = GRADE_BANDED_MATCHING
+    output_dir = os.path.join(os.path.dirname(__file__), "genR")
+    
+    def full_run(reason):
+        print(f"\nRunning every stage: {reason}")
+        output_dir, report = run_pipeline(csv_file, config_file, grade_csv, quality_weight, grade_weight,
+                                          top_k, progress, max_memory_mb, blossom, grade_banded)
+        report.record('incremental', {'applied': False, 'reason': reason})
+        report.save(output_dir)
+        return output_dir, report
+    
+    if not SAVE_INCREMENTAL_STATE or SIMILARITY_ENGINE != "numpy":
+        return full_run("incremental runs need SAVE_INCREMENTAL_STATE and the numpy engine")
+    state = load_state(output_dir)
+    if state is None:
+        return full_run("no state saved by an earlier run")
+    if state['settings'] != incremental_settings(top_k, quality_weight, grade_weight, blossom, grade_banded):
+        return full_run("settings differ from the earlier run")
+    
+    if progress is None:
+        progress = StageProgress(PIPELINE_STAGES, lambda percent, text: None)
+    report = RunReport()
+    report.record('top_k', top_k)
+    report.record('quality_weight', quality_weight)
+    report.record('grade_weight', grade_weight)
+    
+    # The earlier outputs are replaced as the run goes rather than purged
+    progress.start(0)
+    rows = progress.track(read_csv_rows(csv_file), count_lines(csv_file), every=PROGRESS_EVERY_ROWS)
+    pairs = apply_replacements(rows, load_replacements(config_file))
+    pairs = write_through(pairs, intermediate_path(output_dir, "modified_csv.csv"), to_row=itemgetter(1))
+    records = with_distance_features(survey_records(pairs))
+    records = write_through(records, intermediate_path(output_dir, "processed_distances.csv"),
+                            to_row=lambda item: [item[0].email] + item[1].tolist())
+    records, features = collect_features(records)
+    
+    progress.start(1)
+    respondents = RespondentTable.from_records(records)
+    del records
+    respondents.load_grades(grade_csv)
+    reason = survey_change(state, respondents, features)
+    if reason:
+        return full_run(reason)
+    
+    progress.start(2)
+    report.start_stage('similarity_and_filtering')
+    emails = respondents.emails
+    n, first = len(emails), len(state['emails'])
+    report.record('respondents', n)
+    gender_prefs = respondents.gender_preferences()
+    people = [gender_prefs.get(email) for email in emails]
+    bucketed = BUCKETED_SIMILARITY
+    report.record('bucketed_similarity', bucketed)
+    print(f"\nMerging {n - first} new respondents into the lists of {first}")
+    # The new rows are ranked as stage 3 ranks every row
+    blocks = iter_ranked_blocks(features, similarity_block_size(n, max_memory_mb), top_k if bucketed else None,
+                                SIMILARITY_WORKERS, compatibility_buckets(people) if bucketed else None, first)
+    blocks = progress.track(blocks, n - first, size=lambda block: len(block[1]))
+    new_lists = [candidates for _, ranked in blocks for candidates in ranked]
+    # The saved lists are the filtered ones, so only owners that accept a
+    # new respondent's gender get them merged in
+    accepts, wants_codes, gender_codes = compile_compatibility(people)
+    merged = merge_new_rows(features, state['lists'], range(first, n), top_k=top_k,
+                            eligible=lambda owners, row: accepts[wants_codes[owners], gender_codes[row]])
+    new_ranks = prefilter_by_preferences(zip(range(first, n), new_lists), emails, respondents, top_k=top_k)
+    filtered_ranks = RankLists.from_id_lists(
+        emails, np.concatenate([state['lists'].owners, new_ranks.owners]),
+        merged + [new_ranks.candidates(i) for i in range(len(new_ranks))])
+    # There are no unfiltered lists to bring up to date
+    for name in ("similarity_list", "similarity_list.csv"):
+        path = os.path.join(output_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    report.end_stage('similarity_and_filtering')
+    report.record_artifact('similarity_list', os.path.join(output_dir, "similarity_list"))
+    report.record_artifact('similarity_list.csv', os.path.join(output_dir, "similarity_list.csv"))
+    report.record('peak_rss_mb_after_similarity', peak_rss_mb())
+    
+    progress.start(3)
+    save_filtered_lists(output_dir, filtered_ranks, report)
+    
+    progress.start(4)
+    report.start_stage('pairing')
+    matching_times = {}
+    rematched = {}
+    changed_emails = [email for email, old, grade in zip(emails, state['grades'], respondents.grades) if old != grade]
+    results = update_optimal_pairs(filtered_ranks, respondents, state['pairs'], emails[first:], changed_emails,
+                                   quality_weight=quality_weight, grade_weight=grade_weight, top_k=top_k,
+                                   timings=matching_times, progress=progress.update, rematched=rematched,
+                                   grade_banded=grade_banded)
+    report.end_stage('pairing')
+    report.record('matching_times', matching_times)
+    report.record('grade_banded_matching', grade_banded)
+    report.record('incremental', {
+        'applied': True,
+        'new_respondents': n - first,
+        'changed_grades': len(changed_emails),
+        'rematched': rematched,
+    })
+    
+    analyzer = MatchAnalysis(output_dir, respondents, matching_times)
+    analyzer.analyze_all_algorithms()
+    save_state(output_dir, state['settings'], respondents, features, filtered_ranks, results)
+    report.record_artifact('incremental', state_path(output_dir))
+    report.record('peak_rss_mb', peak_rss_mb())
+    report.save(output_dir)
+    return output_dir, report
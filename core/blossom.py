@@ -0,0 +1,408 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+def max_weight_matching(n: int, edges: Sequence[Tuple[int, int, int]], max_cardinality: bool = False) -> List[int]:
+    """Maximum-weight matching on a general (non-bipartite) graph
+
+    Edmonds' blossom algorithm with primal-dual weights in O(n + edges)
+    memory. edges are (i, j, weight) triples over vertices 0..n-1 with
+    integer weights; only the listed edges are ever considered, so no n x n
+    matrix is built. With max_cardinality set, the heaviest of the largest
+    matchings is returned. Returns mate, where mate[v] is the vertex paired
+    with v or -1.
+
+    Tree growing only follows tight edges, found by walking each vertex's
+    edges heaviest first and stopping once none can be tight; the smallest
+    dual change is then taken over all edges at once with numpy instead of
+    tracking least-slack edges per blossom.
+    """
+    edges = [(i, j, w) for i, j, w in edges if i != j]
+    nedge = len(edges)
+    if n == 0 or nedge == 0:
+        return [-1] * n
+
+    maxweight = max(0, max(w for _, _, w in edges))
+    weight2 = [2 * w for _, _, w in edges]
+
+    # Edge k has endpoints 2k (vertex i) and 2k + 1 (vertex j)
+    endpoint = [edges[p // 2][p % 2] for p in range(2 * nedge)]
+    # Remote endpoints of the edges incident to each vertex, heaviest first
+    neighbend = [[] for _ in range(n)]
+    for k, (i, j, _) in enumerate(edges):
+        neighbend[i].append(2 * k + 1)
+        neighbend[j].append(2 * k)
+    for ends in neighbend:
+        ends.sort(key=lambda p: -weight2[p >> 1])
+
+    edge_i = np.array([i for i, _, _ in edges], dtype=np.intp)
+    edge_j = np.array([j for _, j, _ in edges], dtype=np.intp)
+    edge_weight2 = np.array(weight2, dtype=np.int64)
+
+    # mate[v] is the remote endpoint of v's matched edge, or -1
+    mate = [-1] * n
+    # Labels of top-level blossoms: 0 unlabeled, 1 S, 2 T (5 marks a scan)
+    label = [0] * (2 * n)
+    labelend = [-1] * (2 * n)
+    inblossom = list(range(n))
+    blossomparent = [-1] * (2 * n)
+    blossomchilds = [None] * (2 * n)
+    blossombase = list(range(n)) + [-1] * n
+    blossomendps = [None] * (2 * n)
+    unusedblossoms = list(range(n, 2 * n))
+    # Non-trivial blossoms currently in use, nested ones included
+    active_blossoms = set()
+    dualvar = [maxweight] * n + [0] * n
+    allowedge = [False] * nedge
+    queue = []
+
+    def blossom_leaves(b):
+        if b < n:
+            yield b
+        else:
+            for t in blossomchilds[b]:
+                if t < n:
+                    yield t
+                else:
+                    yield from blossom_leaves(t)
+
+    def assign_label(w, t, p):
+        b = inblossom[w]
+        label[w] = label[b] = t
+        labelend[w] = labelend[b] = p
+        if t == 1:
+            queue.extend(blossom_leaves(b))
+        elif t == 2:
+            base = blossombase[b]
+            assign_label(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    def scan_blossom(v, w):
+        """Trace back from v and w; return the base of a new blossom or -1 for an augmenting path"""
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            b = inblossom[v]
+            if label[b] & 4:
+                base = blossombase[b]
+                break
+            path.append(b)
+            label[b] = 5
+            if labelend[b] == -1:
+                v = -1
+            else:
+                v = endpoint[labelend[b]]
+                b = inblossom[v]
+                v = endpoint[labelend[b]]
+            if w != -1:
+                v, w = w, v
+        for b in path:
+            label[b] = 1
+        return base
+
+    def add_blossom(base, k):
+        v, w, _ = edges[k]
+        bb = inblossom[base]
+        bv = inblossom[v]
+        bw = inblossom[w]
+        b = unusedblossoms.pop()
+        blossombase[b] = base
+        blossomparent[b] = -1
+        blossomparent[bb] = b
+        blossomchilds[b] = path = []
+        blossomendps[b] = endps = []
+        while bv != bb:
+            blossomparent[bv] = b
+            path.append(bv)
+            endps.append(labelend[bv])
+            v = endpoint[labelend[bv]]
+            bv = inblossom[v]
+        path.append(bb)
+        path.reverse()
+        endps.reverse()
+        endps.append(2 * k)
+        while bw != bb:
+            blossomparent[bw] = b
+            path.append(bw)
+            endps.append(labelend[bw] ^ 1)
+            w = endpoint[labelend[bw]]
+            bw = inblossom[w]
+        label[b] = 1
+        labelend[b] = labelend[bb]
+        dualvar[b] = 0
+        for v in blossom_leaves(b):
+            if label[inblossom[v]] == 2:
+                # T-vertices become S-vertices inside the new blossom
+                queue.append(v)
+            inblossom[v] = b
+        active_blossoms.add(b)
+
+    def expand_blossom(b, endstage):
+        for s in blossomchilds[b]:
+            blossomparent[s] = -1
+            if s < n:
+                inblossom[s] = s
+            elif endstage and dualvar[s] == 0:
+                expand_blossom(s, endstage)
+            else:
+                for v in blossom_leaves(s):
+                    inblossom[v] = s
+        if not endstage and label[b] == 2:
+            # Relabel the sub-blossoms on the path from the entry child to the base
+            entrychild = inblossom[endpoint[labelend[b] ^ 1]]
+            j = blossomchilds[b].index(entrychild)
+            if j & 1:
+                j -= len(blossomchilds[b])
+                jstep = 1
+                endptrick = 0
+            else:
+                jstep = -1
+                endptrick = 1
+            p = labelend[b]
+            while j != 0:
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossomendps[b][j - endptrick] ^ endptrick ^ 1]] = 0
+                assign_label(endpoint[p ^ 1], 2, p)
+                allowedge[blossomendps[b][j - endptrick] // 2] = True
+                j += jstep
+                p = blossomendps[b][j - endptrick] ^ endptrick
+                allowedge[p // 2] = True
+                j += jstep
+            # The base becomes a T-blossom without labelling its mate
+            bv = blossomchilds[b][j]
+            label[endpoint[p ^ 1]] = label[bv] = 2
+            labelend[endpoint[p ^ 1]] = labelend[bv] = p
+            j += jstep
+            while blossomchilds[b][j] != entrychild:
+                bv = blossomchilds[b][j]
+                if label[bv] == 1:
+                    j += jstep
+                    continue
+                reached = -1
+                for v in blossom_leaves(bv):
+                    if label[v] != 0:
+                        reached = v
+                        break
+                if reached != -1:
+                    label[reached] = 0
+                    label[endpoint[mate[blossombase[bv]]]] = 0
+                    assign_label(reached, 2, labelend[reached])
+                j += jstep
+        label[b] = labelend[b] = -1
+        blossomchilds[b] = blossomendps[b] = None
+        blossombase[b] = -1
+        active_blossoms.discard(b)
+        unusedblossoms.append(b)
+
+    def augment_blossom(b, v):
+        """Swap matched and unmatched edges on the path from v to the base of b"""
+        t = v
+        while blossomparent[t] != b:
+            t = blossomparent[t]
+        if t >= n:
+            augment_blossom(t, v)
+        i = j = blossomchilds[b].index(t)
+        if i & 1:
+            j -= len(blossomchilds[b])
+            jstep = 1
+            endptrick = 0
+        else:
+            jstep = -1
+            endptrick = 1
+        while j != 0:
+            j += jstep
+            t = blossomchilds[b][j]
+            p = blossomendps[b][j - endptrick] ^ endptrick
+            if t >= n:
+                augment_blossom(t, endpoint[p])
+            j += jstep
+            t = blossomchilds[b][j]
+            if t >= n:
+                augment_blossom(t, endpoint[p ^ 1])
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+        # v is the new base
+        blossomchilds[b] = blossomchilds[b][i:] + blossomchilds[b][:i]
+        blossomendps[b] = blossomendps[b][i:] + blossomendps[b][:i]
+        blossombase[b] = blossombase[blossomchilds[b][0]]
+
+    def augment_matching(k):
+        v, w, _ = edges[k]
+        for s, p in ((v, 2 * k + 1), (w, 2 * k)):
+            while True:
+                bs = inblossom[s]
+                if bs >= n:
+                    augment_blossom(bs, s)
+                mate[s] = p
+                if labelend[bs] == -1:
+                    break
+                t = endpoint[labelend[bs]]
+                bt = inblossom[t]
+                s = endpoint[labelend[bt]]
+                j = endpoint[labelend[bt] ^ 1]
+                if bt >= n:
+                    augment_blossom(bt, j)
+                mate[j] = labelend[bt]
+                p = labelend[bt] ^ 1
+
+    def apply_smallest_delta():
+        """Make the smallest dual change that creates progress
+
+        Returns the delta type, its edge or blossom, and the new minimum
+        vertex dual.
+        """
+        top = np.array(inblossom, dtype=np.intp)
+        top_label = np.array(label)[top]
+        vertex_dual = np.array(dualvar[:n], dtype=np.int64)
+
+        deltatype = -1
+        delta = target = None
+        if not max_cardinality:
+            deltatype = 1
+            delta = int(vertex_dual.min())
+        label_i = top_label[edge_i]
+        label_j = top_label[edge_j]
+        s_i = label_i == 1
+        s_j = label_j == 1
+        slack = vertex_dual[edge_i] + vertex_dual[edge_j] - edge_weight2
+
+        # Type 2: edge from an S-vertex to an unlabeled vertex
+        to_free = np.flatnonzero((s_i & (label_j == 0)) | (s_j & (label_i == 0)))
+        if len(to_free):
+            k = int(to_free[np.argmin(slack[to_free])])
+            if deltatype == -1 or slack[k] < delta:
+                delta = int(slack[k])
+                deltatype = 2
+                target = k
+        # Type 3: edge between two different S-blossoms
+        s_to_s = np.flatnonzero(s_i & s_j & (top[edge_i] != top[edge_j]))
+        if len(s_to_s):
+            k = int(s_to_s[np.argmin(slack[s_to_s])])
+            # Integer weights keep the slack of S-S edges even
+            if deltatype == -1 or slack[k] // 2 < delta:
+                delta = int(slack[k]) // 2
+                deltatype = 3
+                target = k
+        # Type 4: dual of a top-level T-blossom reaching zero
+        for b in active_blossoms:
+            if blossomparent[b] == -1 and label[b] == 2 and (deltatype == -1 or dualvar[b] < delta):
+                delta = dualvar[b]
+                deltatype = 4
+                target = b
+        if deltatype == -1:
+            # Only reachable with max_cardinality: the matching is maximum
+            deltatype = 1
+            delta = max(0, int(vertex_dual.min()))
+
+        vertex_dual[top_label == 1] -= delta
+        vertex_dual[top_label == 2] += delta
+        dualvar[:n] = vertex_dual.tolist()
+        for b in active_blossoms:
+            if blossomparent[b] == -1:
+                if label[b] == 1:
+                    dualvar[b] += delta
+                elif label[b] == 2:
+                    dualvar[b] -= delta
+        return deltatype, target, int(vertex_dual.min())
+
+    # Each stage grows alternating trees until it finds an augmenting path
+    for _ in range(n):
+        label[:] = [0] * (2 * n)
+        allowedge[:] = [False] * nedge
+        queue[:] = []
+        # Roots whose tree has grown beyond the root itself this stage
+        grown = [False] * n
+
+        for v in range(n):
+            if mate[v] == -1 and label[inblossom[v]] == 0:
+                if inblossom[v] == v:
+                    label[v] = 1
+                    labelend[v] = -1
+                    queue.append(v)
+                else:
+                    assign_label(v, 1, -1)
+
+        augmented = False
+        # No vertex dual is below this, which bounds which edges can be tight
+        min_dual = min(dualvar[:n])
+        while True:
+            while queue and not augmented:
+                v = queue.pop()
+                bv = inblossom[v]
+                if label[bv] != 1:
+                    # Matched to another bare root after being queued
+                    continue
+                dual_v = dualvar[v]
+                for p in neighbend[v]:
+                    k = p >> 1
+                    if weight2[k] < dual_v + min_dual:
+                        # This and every lighter edge of v has positive slack
+                        break
+                    w = endpoint[p]
+                    bw = inblossom[w]
+                    if bv == bw:
+                        continue
+                    if not allowedge[k]:
+                        if dual_v + dualvar[w] - weight2[k] > 0:
+                            continue
+                        allowedge[k] = True
+                    if label[bw] == 0:
+                        grown[v] = True
+                        assign_label(w, 2, p ^ 1)
+                    elif label[bw] == 1:
+                        if (bv == v and bw == w and labelend[v] == -1 and labelend[w] == -1
+                                and not grown[v] and not grown[w]):
+                            # Two free vertices with no tree attached: match them
+                            # directly and keep growing the other trees
+                            mate[v] = p
+                            mate[w] = p ^ 1
+                            label[v] = label[w] = 0
+                            # Edges allowed while they were S-vertices need
+                            # not stay tight once they are unlabeled
+                            for u in (v, w):
+                                for q in neighbend[u]:
+                                    allowedge[q >> 1] = False
+                            break
+                        base = scan_blossom(v, w)
+                        if base >= 0:
+                            add_blossom(base, k)
+                            bv = inblossom[v]
+                        else:
+                            augment_matching(k)
+                            augmented = True
+                            break
+                    elif label[w] == 0:
+                        # w is inside a T-blossom but not yet reached itself
+                        grown[v] = True
+                        label[w] = 2
+                        labelend[w] = p ^ 1
+
+            if augmented:
+                break
+
+            # No tight edge left: change the duals to make one
+            deltatype, target, min_dual = apply_smallest_delta()
+            if deltatype == 1:
+                break
+            elif deltatype == 2:
+                allowedge[target] = True
+                i, j, _ = edges[target]
+                if label[inblossom[i]] == 0:
+                    i, j = j, i
+                queue.append(i)
+            elif deltatype == 3:
+                allowedge[target] = True
+                i, j, _ = edges[target]
+                queue.append(i)
+            elif deltatype == 4:
+                expand_blossom(target, False)
+
+        if not augmented:
+            break
+
+        # S-blossoms whose dual reached zero are expanded between stages
+        for b in list(active_blossoms):
+            if (blossomparent[b] == -1 and blossombase[b] >= 0
+                    and label[b] == 1 and dualvar[b] == 0):
+                expand_blossom(b, True)
+
+    return [endpoint[p] if p >= 0 else -1 for p in mate]
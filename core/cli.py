@@ -0,0 +1,104 @@
+"""
+Copyright (c) 2025
+This program is part of PyValentin
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+from core import batch
+from core.pipeline import StageProgress
+
+def count_pairs(pairs_file):
+    """Data rows of an optimal_pairs.csv, or None if it was not written"""
+    if not os.path.exists(pairs_file):
+        return None
+    with open(pairs_file, 'r', newline='') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+def run_summary(output_dir, report, elapsed):
+    """Machine-readable summary of a finished run"""
+    summary = {'status': 'ok', 'output_dir': output_dir, 'elapsed_s': elapsed}
+    summary.update(report.as_dict())
+    summary['pairs'] = {
+        algo: count_pairs(os.path.join(output_dir, algo, "optimal_pairs.csv"))
+        for algo in report.metrics.get('matching_times', {})
+    }
+    return summary
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m core.cli",
+        description="Run the PyValentin pipeline without a GUI and print a JSON summary")
+    parser.add_argument("csv_file", help="survey responses CSV")
+    parser.add_argument("config_file", help="Config.json response mappings")
+    parser.add_argument("grade_csv", help="grade data CSV")
+    parser.add_argument("--quality-weight", type=float, default=0.5,
+                        help="quality vs. quantity balance, 0.0-1.0 (default 0.5)")
+    parser.add_argument("--grade-weight", type=float, default=batch.RECOMMENDED_GRADE_WEIGHT,
+                        help=f"grade weight, 0.0-1.0 (default {batch.RECOMMENDED_GRADE_WEIGHT})")
+    parser.add_argument("--top-k", type=int, default=0,
+                        help="candidates kept per list; 0 keeps all (default)")
+    parser.add_argument("--max-memory-mb", type=float, default=None,
+                        help="memory budget of the similarity stage in MiB; its distance blocks are sized "
+                             "to fit (default: blocks of a fixed row count)")
+    parser.add_argument("--blossom", action='store_true', default=None,
+                        help="also pair with Blossom matching, saved to core/genR/blossom; slower than all "
+                             "the other algorithms together (default: ENABLE_BLOSSOM_MATCHING in core/batch.py)")
+    parser.add_argument("--grade-banded", action='store_true', default=None,
+                        help="solve the grade-sensitive pairs one grade band at a time: much faster on "
+                             "school-wide surveys, slightly lower pair quality "
+                             "(default: GRADE_BANDED_MATCHING in core/batch.py)")
+    parser.add_argument("--incremental", action='store_true',
+                        help="match only the rows added to csv_file since the last run into its pairs; "
+                             "runs every stage when that is not possible")
+    parser.add_argument("--quiet", action='store_true',
+                        help="print only the summary, no progress or stage logs")
+    args = parser.parse_args(argv)
+
+    for name in ("csv_file", "config_file", "grade_csv"):
+        if not os.path.isfile(getattr(args, name)):
+            parser.error(f"{name}: no such file: {getattr(args, name)}")
+    for name in ("quality_weight", "grade_weight"):
+        if not 0.0 <= getattr(args, name) <= 1.0:
+            parser.error(f"--{name.replace('_', '-')} must be between 0.0 and 1.0")
+    if args.max_memory_mb is not None and args.max_memory_mb <= 0:
+        parser.error("--max-memory-mb must be positive")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    top_k = args.top_k if args.top_k > 0 else None
+
+    # stdout carries only the JSON summary; the stages' own prints and the
+    # progress lines go to stderr
+    log = io.StringIO() if args.quiet else sys.stderr
+    def show_progress(percent, text):
+        print(f"[{percent:5.1f}%] {text}", file=log)
+    progress = StageProgress(batch.PIPELINE_STAGES, show_progress)
+
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(log):
+            run = batch.run_incremental_pipeline if args.incremental else batch.run_pipeline
+            output_dir, report = run(args.csv_file, args.config_file, args.grade_csv,
+                                     args.quality_weight, args.grade_weight, top_k, progress,
+                                     max_memory_mb=args.max_memory_mb, blossom=args.blossom, grade_banded=args.grade_banded)
+    except Exception as e:
+        print(json.dumps({'status': 'error', 'error': f"{type(e).__name__}: {e}",
+                          'elapsed_s': time.perf_counter() - start}))
+        return 1
+    print(json.dumps(run_summary(output_dir, report, time.perf_counter() - start)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+# Defaults the front ends show before any pipeline code is loaded; this
+# module must stay import-cheap (no numpy, scipy or core engines)
+
+# Grade weight the sliders start at
+RECOMMENDED_GRADE_WEIGHT = 0.7
+
+# Limits of the grade-sensitive matchers: pairs further apart in grade, or
+# of lower quality after the grade penalty, are never kept
+MAX_GRADE_DIFFERENCE = 2
+MIN_MATCH_QUALITY = 0.3
+# Factor by which match quality is reduced per grade difference
+GRADE_PENALTY_FACTOR = 0.2
@@ -0,0 +1,172 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from core.matching import RankIndex
+from core.rankstore import save_rank_lists, load_rank_lists
+
+# What a run leaves in core/genR/incremental so that responses arriving later
+# can be matched in without redoing every stage:
+#   state.json    the run's settings, and every respondent's email, gender,
+#                 preference and grade in survey order
+#   features.npy  the respondent matrix stage 3 ranked
+#   lists/        the filtered lists new respondents are merged into
+#   pairs.json    each matcher's pairs, as it returned them
+STATE_FOLDER = "incremental"
+
+def state_path(output_dir):
+    return os.path.join(output_dir, STATE_FOLDER)
+
+def save_state(output_dir, settings, respondents, features, lists, pairs):
+    """Write the state of a finished run, replacing any earlier one"""
+    path = state_path(output_dir)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    with open(os.path.join(path, "state.json"), 'w', encoding='utf-8') as f:
+        json.dump({
+            'settings': settings,
+            'emails': respondents.emails,
+            'genders': respondents.genders,
+            'preferences': respondents.preferences,
+            'grades': respondents.grades,
+        }, f)
+    np.save(os.path.join(path, "features.npy"), features)
+    save_rank_lists(os.path.join(path, "lists"), lists)
+    with open(os.path.join(path, "pairs.json"), 'w', encoding='utf-8') as f:
+        json.dump(pairs, f)
+
+def load_state(output_dir):
+    """The state save_state left in output_dir as a dict, or None if there is none"""
+    path = state_path(output_dir)
+    if not os.path.exists(os.path.join(path, "pairs.json")):
+        return None
+    with open(os.path.join(path, "state.json"), 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    # Read into memory: the next save_state rewrites these very files
+    state['features'] = np.load(os.path.join(path, "features.npy"))
+    state['lists'] = load_rank_lists(os.path.join(path, "lists"), mmap=False)
+    with open(os.path.join(path, "pairs.json"), 'r', encoding='utf-8') as f:
+        state['pairs'] = json.load(f)
+    return state
+
+def survey_change(state, respondents, features):
+    """Why the survey is not the saved run's with rows appended, or None if it is"""
+    n_old = len(state['emails'])
+    if len(respondents) < n_old or respondents.emails[:n_old] != state['emails']:
+        return "earlier responses were removed or reordered"
+    if (respondents.genders[:n_old] != state['genders'] or respondents.preferences[:n_old] != state['preferences']
+            or features.shape[1] != state['features'].shape[1]
+            or not np.array_equal(features[:n_old], state['features'])):
+        return "earlier responses were edited"
+    added = respondents.emails[n_old:]
+    if len(set(added)) < len(added) or not set(added).isdisjoint(state['emails']):
+        return "a respondent answered more than once"
+    return None
+
+# Entries whose distances merge_new_rows computes at a time
+MERGE_CHUNK_ENTRIES = 1 << 12
+
+def merge_new_rows(features, lists, new_rows, eligible=None, top_k=None):
+    """Candidate id lists of the owners of lists with new_rows merged in
+
+    Lists stay in stage 3 order: nearest first, ties by row, which puts a
+    new row after every old candidate at its distance. Each new row is
+    placed by a binary search per list, so the owners' distances to
+    everyone are never computed; when the lists are short, their entries'
+    distances are computed once up front instead of on every search.
+    eligible(owners, row) masks the owners that may list row (all by
+    default); with top_k set the lists are cut back to top_k.
+    """
+    owners = np.asarray(lists.owners, dtype=np.int64)
+    starts = lists.indptr[:-1]
+    lengths = np.diff(lists.indptr)
+
+    def squared_distances(a, b):
+        """Exact squared distances of the pairs (a[i], b[i]), so that users
+        with identical answers tie as they do in stage 3"""
+        distances = np.empty(len(a))
+        for i in range(0, len(a), MERGE_CHUNK_ENTRIES):
+            chunk = slice(i, i + MERGE_CHUNK_ENTRIES)
+            distances[chunk] = ((features[a[chunk]] - features[b[chunk]]) ** 2).sum(axis=1)
+        return distances
+
+    listed = None
+    searches = len(new_rows) * len(owners) * max(1.0, np.log2(lengths.max(initial=0) + 1))
+    if 0 < len(lists.indices) <= searches:
+        listed = squared_distances(np.repeat(owners, lengths), lists.indices)
+
+    found = []
+    for row in new_rows:
+        listing = owners != row
+        if eligible is not None:
+            listing &= eligible(owners, row)
+        which = np.flatnonzero(listing)
+        target = squared_distances(owners[which], np.full(len(which), row))
+        low, high = np.zeros(len(which), dtype=np.int64), lengths[which].copy()
+        while True:
+            active = np.flatnonzero(low < high)
+            if not len(active):
+                break
+            middle = (low[active] + high[active]) // 2
+            entries = starts[which[active]] + middle
+            if listed is not None:
+                probed = listed[entries]
+            else:
+                probed = squared_distances(owners[which[active]], lists.indices[entries])
+            before = probed <= target[active]
+            low[active] = np.where(before, middle + 1, low[active])
+            high[active] = np.where(before, high[active], middle)
+        if top_k is not None:
+            kept = low < top_k
+            which, low, target = which[kept], low[kept], target[kept]
+        found.append((which, low, target, np.full(len(which), row)))
+
+    id_lists = [lists.candidates(i) for i in range(len(owners))]
+    if not found:
+        return id_lists
+    which, positions, distances, rows = (np.concatenate(parts) for parts in zip(*found))
+    order = np.lexsort((rows, distances, which))
+    which, positions, rows = which[order], positions[order], rows[order]
+    bounds = np.flatnonzero(np.diff(which)) + 1
+    for group in np.split(np.arange(len(which)), bounds):
+        i = int(which[group[0]])
+        merged = np.insert(id_lists[i], positions[group], rows[group])
+        id_lists[i] = merged[:top_k] if top_k is not None else merged
+    return id_lists
+
+def restricted_ranks(ranks, members):
+    """ranks with only the ids in members, as owners and as candidates
+
+    Positions and list lengths stay those of the full lists, so every
+    matcher scores a pair among members exactly as it does on ranks.
+    """
+    keep = np.zeros(len(ranks), dtype=bool)
+    keep[members] = True
+    owner_ids = ranks.owner_ids[keep[ranks.owner_ids]]
+    lists = {}
+    for owner in owner_ids.tolist():
+        candidates = ranks.candidates_of(owner)
+        kept = keep[candidates]
+        if kept.any():
+            lists[owner] = (candidates[kept], ranks.positions_of(owner)[kept], int(ranks.lengths[owner]))
+    return RankIndex(ranks.ids, owner_ids, lists)
+
+def pair_costs(ranks, a, b):
+    """Lower of the two list positions of (a[i], b[i]) as a fraction of the
+    list length, inf where neither lists the other"""
+    position_ab, position_ba = ranks.position(a, b), ranks.position(b, a)
+    cost_ab = np.where(position_ab >= 0, position_ab / np.maximum(ranks.lengths[a], 1), np.inf)
+    cost_ba = np.where(position_ba >= 0, position_ba / np.maximum(ranks.lengths[b], 1), np.inf)
+    return np.minimum(cost_ab, cost_ba)
+
+def best_new_costs(ranks, new):
+    """Lowest pair cost of each id with any id in the mask new, either way"""
+    owners, candidates = ranks.edge_owners, ranks.candidates
+    costs = ranks.positions / np.maximum(ranks.lengths[owners], 1)
+    touching = new[owners] | new[candidates]
+    best = np.full(len(ranks), np.inf)
+    np.minimum.at(best, owners[touching], costs[touching])
+    np.minimum.at(best, candidates[touching], costs[touching])
+    return best
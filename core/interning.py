@@ -0,0 +1,48 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+class EmailIds:
+    """Dense int32 id for every email, assigned once in first-seen order
+
+    The matching layer works on these ids, in arrays and bitsets, and only
+    turns them back into emails (emails[id]) when results are written.
+    """
+    def __init__(self, emails: Iterable[str] = ()):
+        self.emails: List[str] = []
+        self.ids: Dict[str, int] = {}
+        for email in emails:
+            self.intern(email)
+
+    def __len__(self):
+        return len(self.emails)
+
+    def __contains__(self, email):
+        return email in self.ids
+
+    def intern(self, email: str) -> int:
+        """Id of email, assigning the next free id the first time it is seen"""
+        i = self.ids.get(email)
+        if i is None:
+            i = self.ids[email] = len(self.emails)
+            self.emails.append(email)
+        return i
+
+    def intern_all(self, emails: Iterable[str]) -> np.ndarray:
+        intern = self.intern
+        return np.array([intern(email) for email in emails], dtype=np.int32)
+
+    def get(self, email: str) -> Optional[int]:
+        return self.ids.get(email)
+
+    def lookup(self, ids) -> List[str]:
+        """Emails of a sequence of ids"""
+        emails = self.emails
+        return [emails[i] for i in ids]
+
+    def sorted_ids(self, ids=None) -> np.ndarray:
+        """ids (all by default) in the order their emails sort in"""
+        if ids is None:
+            ids = range(len(self.emails))
+        emails = self.emails
+        return np.array(sorted(ids, key=emails.__getitem__), dtype=np.int32)
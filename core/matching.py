@@ -1,136 +1,338 @@
 import os
 import json
 
+from typing import Optional
+
+import numpy as np
+
+from core.interning import EmailIds
+from core.rankstore import NO_MATCHES, RankLists
+
+class RankIndex:
+    """Ranked candidate lists over interned email ids, built once
+
+    ids interns every owner and candidate email and owner_ids lists the
+    owners in the order their rows first appear. For owner o,
+    candidates_of(o) are its distinct candidates best first, positions_of(o)
+    their first positions in its list and lengths[o] the full list length
+    (0 without matches). The lists sit back to back in the edge arrays
+    edge_owners, candidates and positions, and position() looks up many
+    (owner, candidate) pairs at once through sorted owner * n + candidate
+    keys instead of list.index() and membership scans. Later rows win for
+    duplicate owners, but a row with no matches never replaces a list.
+    """
+    def __init__(self, ids: EmailIds, owner_ids, lists):
+        """lists maps owner id -> (distinct candidate ids, their positions, list length)"""
+        n = len(ids)
+        self.ids = ids
+        self.owner_ids = np.asarray(owner_ids, dtype=np.int32)
+        self.lengths = np.zeros(n, dtype=np.int64)
+        self.starts = np.zeros(n, dtype=np.int64)
+        self.counts = np.zeros(n, dtype=np.int64)
+        
+        owners, candidates, positions = [], [], []
+        start = 0
+        for owner in self.owner_ids.tolist():
+            if owner not in lists:
+                continue
+            ranked, ranks, length = lists[owner]
+            self.lengths[owner] = length
+            self.starts[owner] = start
+            self.counts[owner] = len(ranked)
+            start += len(ranked)
+            owners.append(np.full(len(ranked), owner, dtype=np.int32))
+            candidates.append(np.asarray(ranked, dtype=np.int32))
+            positions.append(np.asarray(ranks, dtype=np.int32))
+        
+        empty = np.empty(0, dtype=np.int32)
+        self.edge_owners = np.concatenate(owners) if owners else empty
+        self.candidates = np.concatenate(candidates) if candidates else empty
+        self.positions = np.concatenate(positions) if positions else empty
+        
+        keys = self.pair_keys(self.edge_owners, self.candidates)
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._key_positions = self.positions[order]
+
+    @classmethod
+    def from_rows(cls, similarity_data, ids: Optional[EmailIds] = None) -> 'RankIndex':
+        """Build from [email, candidate email, ...] rows, interning as it reads"""
+        ids = ids if ids is not None else EmailIds()
+        intern = ids.intern
+        owner_ids, lists = {}, {}
+        for entry in similarity_data:
+            owner = intern(entry[0])
+            owner_ids.setdefault(owner, None)
+            matches = [intern(m) for m in entry[1:] if m != NO_MATCHES]
+            if not matches:
+                continue
+            first = {}
+            for position, match in enumerate(matches):
+                first.setdefault(match, position)
+            lists[owner] = (list(first), list(first.values()), len(matches))
+        return cls(ids, list(owner_ids), lists)
+
+    @classmethod
+    def from_rank_lists(cls, rank_lists: RankLists, top_k: Optional[int] = None,
+                        ids: Optional[EmailIds] = None) -> 'RankIndex':
+        """Build straight from the integer rank store, without any email rows
+
+        With top_k set, only the top_k candidates of each list are kept.
+        """
+        ids = ids if ids is not None else EmailIds()
+        row_ids = ids.intern_all(rank_lists.emails)
+        # Repeated emails in the survey collapse rows onto one id
+        repeated = len(set(rank_lists.emails)) < len(rank_lists.emails)
+        owner_ids, lists = {}, {}
+        for i, owner_row in enumerate(rank_lists.owners.tolist()):
+            owner = int(row_ids[owner_row])
+            owner_ids.setdefault(owner, None)
+            ranked = row_ids[rank_lists.candidates(i)[:top_k]]
+            if not len(ranked):
+                continue
+            if repeated:
+                _, first = np.unique(ranked, return_index=True)
+                first.sort()
+                lists[owner] = (ranked[first], first, len(ranked))
+            else:
+                lists[owner] = (ranked, np.arange(len(ranked)), len(ranked))
+        return cls(ids, list(owner_ids), lists)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def pair_keys(self, owners, candidates) -> np.ndarray:
+        return np.asarray(owners, dtype=np.int64) * len(self.ids) + np.asarray(candidates, dtype=np.int64)
+
+    def members(self) -> np.ndarray:
+        """Ids that own a list or appear in one, in id order"""
+        return np.union1d(self.owner_ids, self.candidates).astype(np.int32)
+
+    def candidates_of(self, owner: int) -> np.ndarray:
+        """Distinct candidate ids of owner, best first"""
+        start = self.starts[owner]
+        return self.candidates[start:start + self.counts[owner]]
+
+    def positions_of(self, owner: int) -> np.ndarray:
+        start = self.starts[owner]
+        return self.positions[start:start + self.counts[owner]]
+
+    def position(self, owners, candidates) -> np.ndarray:
+        """Position of each candidate in its owner's list, -1 where it is not listed"""
+        keys = self.pair_keys(owners, candidates)
+        if not len(self._keys):
+            return np.full(keys.shape, -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        return np.where(self._keys[found] == keys, self._key_positions[found], -1).astype(np.int64)
+
+class PairScores:
+    """Symmetric list-position score per listed pair, stored as sorted arrays
+
+    score(a, b) = 1 - position / length from whichever of the two lists was
+    read last, the same value the old (email, match) tuple dict ended up
+    with. Keys are a * n + b for both orders, so a lookup is one
+    searchsorted; unlisted pairs score the default.
+    """
+    def __init__(self, rank_index: RankIndex):
+        n = len(rank_index)
+        owners = rank_index.edge_owners.astype(np.int64)
+        candidates = rank_index.candidates.astype(np.int64)
+        values = 1.0 - (rank_index.positions / rank_index.lengths[owners])
+        
+        # Keep the last edge written for each unordered pair
+        low = np.minimum(owners, candidates)
+        high = np.maximum(owners, candidates)
+        unordered = low * n + high
+        order = np.lexsort((np.arange(len(unordered)), unordered))
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = unordered[order][1:] != unordered[order][:-1]
+        chosen = order[last]
+        low, high, values = low[chosen], high[chosen], values[chosen]
+        
+        distinct = low != high
+        keys = np.concatenate([low * n + high, high[distinct] * n + low[distinct]])
+        values = np.concatenate([values, values[distinct]])
+        order = np.argsort(keys, kind='stable')
+        self.n = n
+        self.keys = keys[order]
+        self.values = values[order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.values.nbytes
+
+    def lookup(self, a, b, default=0.0) -> np.ndarray:
+        """Scores of pairs (a[i], b[i]); a or b may be a single id"""
+        keys = np.asarray(a, dtype=np.int64) * self.n + np.asarray(b, dtype=np.int64)
+        if not len(self.keys):
+            return np.full(keys.shape, default, dtype=np.float64)
+        found = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[found] == keys, self.values[found], default)
+
+    def get(self, a: int, b: int, default=None):
+        """Score of one pair, or default if neither lists the other"""
+        key = a * self.n + b
+        found = int(np.searchsorted(self.keys, key))
+        if found < len(self.keys) and self.keys[found] == key:
+            return float(self.values[found])
+        return default
+
+    def neighbours(self, a: int):
+        """(ids, scores) of everyone a has a listed pair with"""
+        lo, hi = np.searchsorted(self.keys, [a * self.n, (a + 1) * self.n])
+        return self.keys[lo:hi] - a * self.n, self.values[lo:hi]
+
 class MatchMaker:
-    def __init__(self, similarity_data, quality_weight=0.5):
+    def __init__(self, similarity_data, quality_weight=0.5, rank_index=None):
         self.similarity_data = similarity_data
         self.quality_weight = quality_weight
-        self.all_participants = self._get_unique_participants()
-        self.match_scores = self._calculate_match_scores()
-        
-    def _get_unique_participants(self):
-        participants = set()
-        for entry in self.similarity_data:
-            participants.add(entry[0])
-            for match in entry[1:]:
-                if match != "No matches found":
-                    participants.add(match)
-        return participants
+        self.rank_index = rank_index if rank_index is not None else RankIndex.from_rows(similarity_data)
+        self.ids = self.rank_index.ids
+        self.match_scores = PairScores(self.rank_index)
+        # Everyone who owns a list or appears in one
+        self.participants = np.zeros(len(self.ids), dtype=bool)
+        self.participants[self.rank_index.members()] = True
     
-    def _calculate_match_scores(self):
-        scores = {}
-        for entry in self.similarity_data:
-            email = entry[0]
-            for i, match in enumerate(entry[1:]):
-                if match != "No matches found":
-                    score = 1.0 - (i / len(entry[1:]))
-                    scores[(email, match)] = score
-                    scores[(match, email)] = score
-        return scores
+    def score(self, email1, email2):
+        """Match score of two emails, or None if neither lists the other"""
+        id1, id2 = self.ids.get(email1), self.ids.get(email2)
+        if id1 is None or id2 is None:
+            return None
+        return self.match_scores.get(id1, id2)
     
     def create_pairs(self):
-        pairs = []
-        unpaired = set(self.all_participants)
-        used_emails = set()
+        used = ~self.participants
         
         # Sort by number of potential matches
-        participants = []
-        for entry in self.similarity_data:
-            participant_email = entry[0]
-            matches = [m for m in entry[1:] if m != "No matches found"]
-            participants.append((participant_email, matches))
-            
-        participants.sort(
-            key=lambda x: len(x[1]),
+        lengths = self.rank_index.lengths
+        participants = sorted(
+            self.rank_index.owner_ids.tolist(),
+            key=lambda participant: lengths[participant],
             reverse=self.quality_weight < 0.5
         )
         
         # First pass matching
-        pairs, unpaired, used_emails = self._first_pass_matching(
-            participants, pairs, unpaired, used_emails)
+        pairs = self._first_pass_matching(participants, used)
             
         # Second pass for remaining singles
-        if unpaired and self.quality_weight < 0.8:
-            pairs, unpaired = self._second_pass_matching(
-                pairs, unpaired, self.similarity_data)
+        if not used.all() and self.quality_weight < 0.8:
+            pairs = self._second_pass_matching(pairs, used)
         
         # Validate final pairs
-        validated_pairs, final_unpaired = self._validate_pairs(pairs, unpaired)
+        return self._validate_pairs(pairs)
+    
+    def create_global_pairs(self):
+        """Pair by always taking the best remaining candidate edge overall
+
+        Every candidate edge is keyed by the adjusted score the first pass
+        uses, so quality_weight shifts the order the same way. The edges are
+        sorted once into a queue (ties broken by email) and popped best
+        first; edges that touch someone already paired are skipped, which
+        keeps the whole run O(E log E) for E candidate edges. Only listed
+        candidates are ever paired; there is no fill-in pass for singles.
+        """
+        index = self.rank_index
+        listed = index.edge_owners != index.candidates
+        sources = index.edge_owners[listed]
+        targets = index.candidates[listed]
+        scores = self.match_scores.lookup(sources, targets)
+        keys = scores * self.quality_weight + (1 - self.quality_weight) * (1 / index.lengths[sources])
+        
+        email_order = np.empty(len(self.ids), dtype=np.int64)
+        email_order[self.ids.sorted_ids()] = np.arange(len(self.ids))
+        order = np.lexsort((email_order[targets], email_order[sources], -keys))
+        
+        pairs = []
+        used = (~self.participants).tolist()
+        remaining = int(self.participants.sum())
+        for a, b in zip(sources[order].tolist(), targets[order].tolist()):
+            if remaining < 2:
+                break
+            if used[a] or used[b]:
+                continue
+            pairs.append((a, b))
+            used[a] = used[b] = True
+            remaining -= 2
         
-        return validated_pairs, final_unpaired
+        return self._validate_pairs(pairs)
     
-    def _first_pass_matching(self, participants, pairs, unpaired, used_emails):
+    def _first_pass_matching(self, participants, used):
         """First pass matching with quality-weighted pairing"""
-        for participant, potential_matches in participants:
-            if participant in used_emails:
+        pairs = []
+        for participant in participants:
+            if used[participant]:
                 continue
 
-            best_match = None
-            best_score = -1
+            potential_matches = self.rank_index.candidates_of(participant)
+            available = potential_matches[~used[potential_matches]]
+            if not len(available):
+                continue
+            
+            scores = self.match_scores.lookup(participant, available, default=0.0)
+            # Adjust score based on quality weight
+            length = int(self.rank_index.lengths[participant])
+            adjusted_scores = scores * self.quality_weight + (1 - self.quality_weight) * (1 / (length or 1))
+            best_match = int(available[np.argmax(adjusted_scores)])
 
-            for match in potential_matches:
-                if match in used_emails:
-                    continue
-                    
-                score = self.match_scores.get((participant, match), 0)
-                # Adjust score based on quality weight
-                adjusted_score = score * self.quality_weight + (1 - self.quality_weight) * (1 / (len(potential_matches) or 1))
+            pairs.append((participant, best_match))
+            used[participant] = True
+            used[best_match] = True
                 
-                if adjusted_score > best_score:
-                    best_score = adjusted_score
-                    best_match = match
-
-            if best_match:
-                pairs.append([participant, best_match])
-                used_emails.add(participant)
-                used_emails.add(best_match)
-                unpaired.discard(participant)
-                unpaired.discard(best_match)
-                
-        return pairs, unpaired, used_emails
+        return pairs
         
-    def _second_pass_matching(self, pairs, unpaired, similarity_data):
-        """Second pass to match remaining singles"""
-        retry_unpaired = list(unpaired)
-        remaining_unpaired = set(unpaired)
+    def _second_pass_matching(self, pairs, used):
+        """Second pass to match remaining singles
+
+        Each single in email order takes the remaining single it scores best
+        with, or else the next one in line.
+        """
+        retry_unpaired = self.ids.sorted_ids(np.flatnonzero(~used).tolist())
+        slot = np.full(len(self.ids), -1, dtype=np.int64)
+        slot[retry_unpaired] = np.arange(len(retry_unpaired))
+        waiting = np.ones(len(retry_unpaired), dtype=bool)
+        next_slot = 0
         
-        while len(retry_unpaired) >= 2:
-            current = retry_unpaired[0]
-            best_match = None
-            best_score = -1
+        for current_slot, current in enumerate(retry_unpaired.tolist()):
+            if not waiting[current_slot]:
+                continue
+            waiting[current_slot] = False
             
-            for match in retry_unpaired[1:]:
-                score = self.match_scores.get((current, match), 0)
-                if score > best_score:
-                    best_score = score
-                    best_match = match
-                    
-            if best_match:
-                pairs.append([current, best_match])
-                retry_unpaired.remove(current)
-                retry_unpaired.remove(best_match)
-                remaining_unpaired.discard(current)
-                remaining_unpaired.discard(best_match)
+            neighbours, scores = self.match_scores.neighbours(current)
+            slots = slot[neighbours]
+            open_slots = slots >= 0
+            open_slots[open_slots] = waiting[slots[open_slots]]
+            if open_slots.any():
+                slots, scores = slots[open_slots], scores[open_slots]
+                best_slot = int(slots[np.lexsort((slots, -scores))[0]])
             else:
-                retry_unpaired.remove(current)
+                next_slot = max(next_slot, current_slot + 1)
+                while next_slot < len(waiting) and not waiting[next_slot]:
+                    next_slot += 1
+                if next_slot == len(waiting):
+                    break
+                best_slot = next_slot
+            
+            best_match = int(retry_unpaired[best_slot])
+            pairs.append((current, best_match))
+            waiting[best_slot] = False
+            used[current] = True
+            used[best_match] = True
                 
-        return pairs, remaining_unpaired
+        return pairs
         
-    def _validate_pairs(self, pairs, unpaired):
-        """Validate pairs and ensure no duplicates"""
+    def _validate_pairs(self, pairs):
+        """Validate pairs, ensure no duplicates and turn ids back into emails"""
         validated_pairs = []
-        paired_emails = set()
-        final_unpaired = set(unpaired)
+        paired = np.zeros(len(self.ids), dtype=bool)
         
-        for pair in pairs:
-            if pair[0] not in paired_emails and pair[1] not in paired_emails:
-                validated_pairs.append(pair)
-                paired_emails.add(pair[0])
-                paired_emails.add(pair[1])
-            else:
-                if pair[0] not in paired_emails:
-                    final_unpaired.add(pair[0])
-                if pair[1] not in paired_emails:
-                    final_unpaired.add(pair[1])
+        for first, second in pairs:
+            if not paired[first] and not paired[second]:
+                validated_pairs.append([self.ids.emails[first], self.ids.emails[second]])
+                paired[first] = True
+                paired[second] = True
                     
-        return validated_pairs, sorted(list(final_unpaired))
+        final_unpaired = self.ids.lookup(np.flatnonzero(self.participants & ~paired).tolist())
+        return validated_pairs, sorted(final_unpaired)
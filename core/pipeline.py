@@ -0,0 +1,150 @@
+import csv
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from core.FixCSV import replace_row_values
+from core.rankstore import RankListWriter
+from core.Ski import pair_midpoint_distances
+from utils.file_handlers import CSVStreamWriter
+
+# Rows batched together when computing distance features
+FEATURE_CHUNK_ROWS = 256
+
+# Streaming stages: each takes an iterable and yields as it reads, so the
+# front half of the pipeline holds one row (or one small chunk) at a time.
+# Only similarity and pairing need the whole survey and act as barriers.
+
+def read_csv_rows(path: str, encoding: str = 'utf-8-sig') -> Iterator[List[str]]:
+    """Yield the rows of a CSV file, header included, one at a time"""
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        yield from csv.reader(f)
+
+def apply_replacements(rows: Iterable[List[str]], replacements) -> Iterator[Tuple[List[str], List[str]]]:
+    """Yield (raw row, row with Config.json replacements applied)"""
+    for row in rows:
+        yield row, replace_row_values(row, replacements)
+
+def write_through(items: Iterable, path: Optional[str], to_row: Optional[Callable] = None, header=None) -> Iterator:
+    """Yield items unchanged while writing each one to the CSV at path
+
+    to_row turns an item into the row to write. With path None the items
+    just pass through, so the file is an optional artifact rather than a
+    hop the next stage has to read back.
+    """
+    if path is None:
+        yield from items
+        return
+    with CSVStreamWriter(path, header) as writer:
+        for item in items:
+            writer.writerow(to_row(item) if to_row else item)
+            yield item
+    stats = writer.close()
+    print(f"\nSaved {stats.rows} rows to {path}")
+    print(f"SHA-256: {stats.checksum}")
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    """Yield lists of up to size consecutive items"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def with_distance_features(records: Iterable, chunk_rows: int = FEATURE_CHUNK_ROWS) -> Iterator[Tuple[object, np.ndarray]]:
+    """Yield (record, features) with the midpoint distance features of record.answers
+
+    Records are taken chunk_rows at a time so the pair indices are applied to
+    a small array instead of one row at a time.
+    """
+    for chunk in iter_chunks(records, chunk_rows):
+        answers = np.array([record.answers for record in chunk], dtype=np.float64).reshape(len(chunk), -1)
+        yield from zip(chunk, pair_midpoint_distances(answers))
+
+def collect_features(stream: Iterable[Tuple[object, np.ndarray]]) -> Tuple[list, np.ndarray]:
+    """Barrier: gather (record, features) pairs into a record list and one feature matrix"""
+    records, rows = [], []
+    for record, features in stream:
+        records.append(record)
+        rows.append(features)
+    matrix = np.vstack(rows) if rows else np.empty((0, 0))
+    return records, np.ascontiguousarray(matrix, dtype=np.float64)
+
+def ranked_rows(blocks: Iterable) -> Iterator[Tuple[int, np.ndarray]]:
+    """Flatten (start, ranked rows) blocks into (row id, candidate ids) pairs"""
+    for start, block in blocks:
+        for offset, ranked in enumerate(block):
+            yield start + offset, ranked
+
+def store_ranked_blocks(blocks: Iterable, path: Optional[str], emails: List[str], list_length: int) -> Iterator:
+    """Yield ranked blocks unchanged while writing them to a rank store at path
+
+    With path None the blocks just pass through.
+    """
+    if path is None:
+        yield from blocks
+        return
+    writer = RankListWriter(path, emails, list_length)
+    try:
+        for start, block in blocks:
+            writer.write_block(start, block)
+            yield start, block
+    finally:
+        writer.close()
+
+class PipelineCancelled(Exception):
+    """Raised at the next progress update once a run has been cancelled"""
+
+class StageProgress:
+    """Turn (done, total) counts within numbered stages into overall progress
+
+    send(percent, text) receives every update. Updates are where a run
+    checks its cancel event, so a cancelled run stops between chunks with
+    PipelineCancelled.
+    """
+    def __init__(self, stage_names: List[str], send: Callable[[float, str], None], cancel=None):
+        self.stage_names = stage_names
+        self.send = send
+        self.cancel = cancel
+        self.index = 0
+
+    def start(self, index: int):
+        self.index = index
+        self.update(0, 0)
+
+    def update(self, done: int, total: int):
+        if self.cancel is not None and self.cancel.is_set():
+            raise PipelineCancelled()
+        fraction = min(done / total, 1.0) if total else 0.0
+        percent = (self.index + fraction) * 100 / len(self.stage_names)
+        text = f"Stage {self.index + 1}/{len(self.stage_names)}: {self.stage_names[self.index]}"
+        if total:
+            text += f" ({done}/{total})"
+        self.send(percent, text)
+
+    def track(self, items: Iterable, total: int, every: int = 1, size: Callable = None) -> Iterator:
+        """Yield items unchanged, updating after every `every` items and at the end
+
+        size gives how many units an item counts for, such as the rows of a
+        block; each item counts as one by default.
+        """
+        done = pending = 0
+        for item in items:
+            yield item
+            step = size(item) if size else 1
+            done += step
+            pending += step
+            if pending >= every:
+                pending = 0
+                self.update(done, total)
+        self.update(done, total)
+
+def count_lines(path: str) -> int:
+    """Number of lines in a file, a cheap row estimate for progress totals"""
+    lines = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            lines += chunk.count(b'\n')
+    return lines
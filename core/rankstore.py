@@ -0,0 +1,121 @@
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+
+NO_MATCHES = "No matches found"
+
+class RankLists:
+    """Ranked candidate lists stored as integer respondent ids
+
+    List i belongs to emails[owners[i]] and its candidates, best first, are
+    indices[indptr[i]:indptr[i + 1]]. An empty list stands for
+    "No matches found".
+    """
+    def __init__(self, emails: List[str], owners: np.ndarray, indptr: np.ndarray, indices: np.ndarray):
+        self.emails = emails
+        self.owners = owners
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.owners)
+
+    def candidates(self, i: int) -> np.ndarray:
+        """Candidate ids of list i, best first"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def iter_rows(self):
+        """Yield [email, candidate email, ...] rows as the CSV lists were laid out"""
+        emails = self.emails
+        for i, owner in enumerate(self.owners.tolist()):
+            candidates = self.candidates(i).tolist()
+            if candidates:
+                yield [emails[owner]] + [emails[j] for j in candidates]
+            else:
+                yield [emails[owner], NO_MATCHES]
+
+    def to_rows(self) -> List[List[str]]:
+        return list(self.iter_rows())
+
+    @classmethod
+    def from_id_lists(cls, emails: List[str], owners, id_lists) -> 'RankLists':
+        """Build from one sequence of candidate ids per owner"""
+        lengths = np.fromiter((len(ids) for ids in id_lists), dtype=np.int64, count=len(id_lists))
+        indptr = np.zeros(len(id_lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        if len(id_lists):
+            indices = np.concatenate([np.asarray(ids, dtype=np.int32) for ids in id_lists])
+        else:
+            indices = np.empty(0, dtype=np.int32)
+        return cls(emails, np.asarray(owners, dtype=np.int32), indptr, indices.astype(np.int32, copy=False))
+
+    @classmethod
+    def from_rows(cls, rows: List[List[str]], emails: Optional[List[str]] = None) -> 'RankLists':
+        """Build from [email, candidate email, ...] rows"""
+        if emails is None:
+            emails = [row[0] for row in rows]
+        email_to_id = {email: i for i, email in enumerate(emails)}
+        owners = [email_to_id[row[0]] for row in rows]
+        id_lists = [[email_to_id[email] for email in row[1:] if email != NO_MATCHES] for row in rows]
+        return cls.from_id_lists(emails, owners, id_lists)
+
+    def write_csv(self, path: str, lineterminator: str = '\n'):
+        """Export the human-readable comma-joined list format"""
+        with open(path, 'w', newline='') as f:
+            for row in self.iter_rows():
+                f.write(','.join(row) + lineterminator)
+
+def save_rank_lists(path: str, rank_lists: RankLists):
+    """Save rank lists as a folder of .npy arrays plus an email dictionary"""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "owners.npy"), rank_lists.owners)
+    np.save(os.path.join(path, "indptr.npy"), rank_lists.indptr)
+    np.save(os.path.join(path, "indices.npy"), rank_lists.indices)
+    save_emails(path, rank_lists.emails)
+
+def save_emails(path: str, emails: List[str]):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "emails.json"), 'w', encoding='utf-8') as f:
+        json.dump(emails, f)
+
+def load_rank_lists(path: str, mmap: bool = True) -> RankLists:
+    """Load rank lists saved by save_rank_lists, memory-mapping the arrays"""
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(path, "emails.json"), 'r', encoding='utf-8') as f:
+        emails = json.load(f)
+    return RankLists(
+        emails,
+        np.load(os.path.join(path, "owners.npy"), mmap_mode=mmap_mode),
+        np.load(os.path.join(path, "indptr.npy"), mmap_mode=mmap_mode),
+        np.load(os.path.join(path, "indices.npy"), mmap_mode=mmap_mode),
+    )
+
+class RankListWriter:
+    """Stream fixed-length candidate lists into a memory-mapped rank store
+
+    Used by stage 3 (see core.pipeline.store_ranked_blocks) so the full list
+    set never has to be held in memory: each block of rows is written as
+    soon as it is ranked.
+    """
+    def __init__(self, path: str, emails: List[str], list_length: int):
+        self.path = path
+        n = len(emails)
+        os.makedirs(path, exist_ok=True)
+        save_emails(path, emails)
+        np.save(os.path.join(path, "owners.npy"), np.arange(n, dtype=np.int32))
+        np.save(os.path.join(path, "indptr.npy"), np.arange(n + 1, dtype=np.int64) * list_length)
+        self.indices = np.lib.format.open_memmap(
+            os.path.join(path, "indices.npy"), mode='w+', dtype=np.int32, shape=(n * list_length,))
+        self.list_length = list_length
+
+    def write_block(self, start: int, ranked_rows):
+        """Write the candidate ids of rows start, start + 1, ..."""
+        for offset, ranked in enumerate(ranked_rows):
+            position = (start + offset) * self.list_length
+            self.indices[position:position + self.list_length] = ranked
+
+    def close(self):
+        self.indices.flush()
+        del self.indices
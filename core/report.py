@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+class RunReport:
+    """Collect stage timings and artifact sizes for a single pipeline run"""
+    def __init__(self):
+        self.stage_times = {}
+        self.artifacts = {}
+        self.metrics = {}
+        self._stage_starts = {}
+
+    def start_stage(self, name: str):
+        """Mark the beginning of a pipeline stage"""
+        self._stage_starts[name] = time.perf_counter()
+
+    def end_stage(self, name: str) -> float:
+        """Mark the end of a pipeline stage and return its duration in seconds"""
+        start = self._stage_starts.pop(name, None)
+        if start is None:
+            return 0.0
+        elapsed = time.perf_counter() - start
+        self.stage_times[name] = elapsed
+        return elapsed
+
+    def record_artifact(self, name: str, path: str):
+        """Record the on-disk size of a generated file or folder"""
+        if os.path.isdir(path):
+            self.artifacts[name] = sum(
+                os.path.getsize(os.path.join(folder, filename))
+                for folder, _, filenames in os.walk(path)
+                for filename in filenames
+            )
+        elif os.path.exists(path):
+            self.artifacts[name] = os.path.getsize(path)
+
+    def record(self, name: str, value):
+        """Record an arbitrary metric"""
+        self.metrics[name] = value
+
+    def as_dict(self) -> Dict:
+        return {
+            'stage_times': self.stage_times,
+            'artifacts': self.artifacts,
+            'metrics': self.metrics
+        }
+
+    def save(self, output_dir: str, filename: str = "run_report.json") -> Optional[str]:
+        """Write the report as JSON next to the other genR results"""
+        output_path = os.path.join(output_dir, filename)
+        try:
+            with open(output_path, 'w') as f:
+                json.dump(self.as_dict(), f, indent=4)
+            return output_path
+        except OSError as e:
+            print(f"Could not save run report: {e}")
+            return None
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB, if the platform reports it"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return max_rss / (1024 * 1024)
+    return max_rss / 1024
+
+def similarity_list_reduction(n: int, top_k: Optional[int]) -> float:
+    """Fraction of the full n x (n - 1) similarity list kept by top-K mode"""
+    full_entries = n * max(n - 1, 0)
+    if not full_entries or not top_k:
+        return 1.0
+    return n * min(top_k, n - 1) / full_entries
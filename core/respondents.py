@@ -0,0 +1,142 @@
+import csv
+from collections import namedtuple
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from core.FixCSV import load_replacements
+from core.pipeline import apply_replacements, read_csv_rows, write_through
+
+EMAIL_COLUMN = "Email Address"
+GENDER_COLUMN = "What is your gender?"
+PREFERENCE_COLUMN = "What gender are you attracted to?"
+
+# Survey answers start after timestamp, email, gender and preference
+FIRST_ANSWER_COLUMN = 4
+
+# Entry of grade_vector for respondents without a known grade
+NO_GRADE = -1
+
+# One survey response: raw email, gender and preference, replaced answer values
+SurveyRecord = namedtuple('SurveyRecord', ['email', 'gender', 'preference', 'answers'])
+
+def survey_records(pairs: Iterable[Tuple[List[str], List[str]]]) -> Iterator[SurveyRecord]:
+    """Yield a SurveyRecord per usable row of a (raw row, replaced row) stream
+
+    The first pair is the header. Rows too short to hold the email, gender
+    and preference columns are skipped.
+    """
+    pairs = iter(pairs)
+    headers, _ = next(pairs)
+    email_idx = headers.index(EMAIL_COLUMN)
+    gender_idx = headers.index(GENDER_COLUMN)
+    pref_idx = headers.index(PREFERENCE_COLUMN)
+    min_length = max(email_idx, gender_idx, pref_idx) + 1
+
+    for row, modified_row in pairs:
+        if len(row) < min_length:
+            continue
+        yield SurveyRecord(row[email_idx].strip(), row[gender_idx].strip(),
+                           row[pref_idx].strip(), modified_row[FIRST_ANSWER_COLUMN:])
+
+class RespondentTable:
+    """Columnar view of the survey shared by every pipeline stage
+
+    Built once per run from the raw survey CSV, the Config.json replacements
+    and the grade CSV. Gender and preference keep their raw values, as the
+    filters compare them; answers hold the numeric values after Config.json
+    replacement.
+    """
+    def __init__(self, emails: List[str], genders: List[str], preferences: List[str],
+                 answers: np.ndarray, grades: Optional[List[Optional[int]]] = None):
+        self.emails = emails
+        self.genders = genders
+        self.preferences = preferences
+        self.answers = answers
+        self.grades = grades if grades is not None else [None] * len(emails)
+        # Later rows win for duplicate emails, as the per-stage dicts did
+        self.index = {email: row for row, email in enumerate(emails)}
+
+    def __len__(self):
+        return len(self.emails)
+
+    def __contains__(self, email):
+        return email in self.index
+
+    @classmethod
+    def from_files(cls, csv_file: str, config_file: str, grade_csv: Optional[str] = None,
+                   modified_csv: Optional[str] = None) -> 'RespondentTable':
+        """Read the survey, replacements and grades once each
+
+        When modified_csv is given, the survey with Config.json replacements
+        applied is written there as it is read.
+        """
+        pairs = apply_replacements(read_csv_rows(csv_file), load_replacements(config_file))
+        pairs = write_through(pairs, modified_csv, to_row=itemgetter(1))
+        table = cls.from_records(survey_records(pairs))
+        if grade_csv:
+            table.load_grades(grade_csv)
+        return table
+
+    @classmethod
+    def from_records(cls, records: Iterable[SurveyRecord]) -> 'RespondentTable':
+        """Build the table from SurveyRecords, such as the survey_records stream"""
+        records = list(records)
+        answers = np.array([record.answers for record in records], dtype=np.float64).reshape(len(records), -1)
+        table = cls([record.email for record in records], [record.gender for record in records],
+                     [record.preference for record in records], answers)
+        print(f"Loaded {len(table)} respondents with {answers.shape[1]} answers each")
+        return table
+
+    def load_grades(self, grade_csv: str):
+        """Align grades from the grade CSV (email in column 3, grade in column 4)"""
+        self.grades = [None] * len(self.emails)
+        with open(grade_csv, 'r', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            next(reader)  # Skip header
+            for row in reader:
+                if len(row) >= 4:
+                    email = row[2].strip()
+                    if email in self.index:
+                        self.grades[self.index[email]] = int(row[3].strip())
+
+    def get(self, email: str) -> Optional[int]:
+        """Row of an email, or None if it is not in the survey"""
+        return self.index.get(email)
+
+    def profile(self, email: str):
+        """(gender, preference) for an email, ('Unknown', 'Unknown') if absent"""
+        row = self.index.get(email)
+        if row is None:
+            return ('Unknown', 'Unknown')
+        return (self.genders[row], self.preferences[row])
+
+    def grade(self, email: str) -> Optional[int]:
+        row = self.index.get(email)
+        return self.grades[row] if row is not None else None
+
+    def gender_preferences(self) -> Dict[str, Dict[str, str]]:
+        """Email -> {"gender", "wants"} mapping used by the preference filters"""
+        return {
+            email: {"gender": self.genders[row], "wants": self.preferences[row]}
+            for email, row in self.index.items()
+        }
+
+    def grade_vector(self, emails: Iterable[str]) -> np.ndarray:
+        """Grades of emails as an int array, NO_GRADE where unknown"""
+        index, grades = self.index, self.grades
+        values = (grades[index[email]] if email in index else None for email in emails)
+        return np.array([NO_GRADE if grade is None else grade for grade in values], dtype=np.int64)
+
+    def grade_map(self) -> Dict[str, int]:
+        """Email -> grade for respondents with a known grade"""
+        return {
+            email: self.grades[row]
+            for email, row in self.index.items()
+            if self.grades[row] is not None
+        }
+
+    def answer_rows(self) -> List[List]:
+        """[email, answer, ...] rows in the layout process_csv produced"""
+        return [[email] + values for email, values in zip(self.emails, self.answers.tolist())]
@@ -11,18 +11,16 @@ import pygame.gfxdraw
 import sys
 import os
 import csv
-from core.FixCSV import replace_values_in_csv
-from core.Ski import process_csv, calculate_distances, calculate_similarity, save_processed_data
-from core.analysis import MatchAnalysis
+from core import batch
+from core.pipeline import StageProgress
 import json
+import threading
+from functools import lru_cache
 from typing import Dict, Tuple, List, Optional
 import time
 import os.path
 from pathlib import Path
 
-# Initialize Pygame
-pygame.init()
-
 # VS Code-inspired color scheme
 COLORS = {
     'background': (30, 30, 30),        # VS Code dark background
@@ -41,6 +39,17 @@ COLORS = {
     'slider_handle': (119, 119, 119),  # Slider handle
 }
 
+# Top-K candidate list sizes offered by the slider (None keeps all candidates)
+TOP_K_CHOICES = [None, 10, 25, 50, 100, 250]
+
+# Custom events the pipeline worker posts to the event loop
+PIPELINE_PROGRESS = pygame.USEREVENT + 1
+PIPELINE_DONE = pygame.USEREVENT + 2
+
+# Milliseconds between frames while a hover animation is running; when
+# nothing animates the loop sleeps until the next event
+ANIMATION_FRAME_MS = 16
+
 ACCEPTED_EXTENSIONS = {
     'csv': ['.csv'],
     'config': ['.json'],
@@ -48,6 +57,16 @@ ACCEPTED_EXTENSIONS = {
     'grade': ['.csv']
 }
 
+@lru_cache(maxsize=None)
+def get_font(size: int) -> pygame.font.Font:
+    """SysFont of the given size, looked up once; SysFont scans the system fonts"""
+    return pygame.font.SysFont('Segoe UI', size)
+
+@lru_cache(maxsize=256)
+def render_text(text: str, color: Tuple[int, int, int], size: int = 14) -> pygame.Surface:
+    """Rendered text surface, reused for as long as the same text is shown"""
+    return get_font(size).render(text, True, color)
+
 def draw_rounded_rect(surface, rect, color, radius=8):
     """Draw a rounded rectangle by combining multiple shapes"""
     if radius > rect.height // 2:
@@ -95,20 +114,28 @@ class ModernButton:
         self.action = action
         self.hovered = False
         self.active = True
-        self.font = pygame.font.SysFont('Segoe UI', 14)
         self.anim_progress = 0  # For hover animation
         self.clicked = False
 
-    def draw(self, surface: pygame.Surface):
-        mouse_pos = pygame.mouse.get_pos()
+    @property
+    def bounds(self) -> pygame.Rect:
+        """Area the button paints, shadow included"""
+        return self.rect.union(self.rect.move(0, 2))
+
+    def state(self):
+        return self.text, self.active, self.anim_progress
+
+    def update(self, mouse_pos) -> bool:
+        """Step the hover animation; True while it is still running"""
         self.hovered = self.rect.collidepoint(mouse_pos)
-        
-        # Background color with animation
         if self.hovered:
             self.anim_progress = min(1.0, self.anim_progress + 0.2)
-        else:
-            self.anim_progress = max(0.0, self.anim_progress - 0.1)
-            
+            return self.anim_progress < 1.0
+        self.anim_progress = max(0.0, self.anim_progress - 0.1)
+        return self.anim_progress > 0.0
+
+    def draw(self, surface: pygame.Surface):
+        # Background color with animation
         base_color = COLORS['button'] if self.active else COLORS['widget_bg']
         hover_color = COLORS['button_hover'] if self.active else COLORS['widget_bg']
         current_color = [
@@ -126,7 +153,7 @@ class ModernButton:
         
         # Text
         text_color = COLORS['text'] if self.active else COLORS['text_disabled']
-        text_surface = self.font.render(self.text, True, text_color)
+        text_surface = render_text(self.text, text_color)
         text_rect = text_surface.get_rect(center=self.rect.center)
         surface.blit(text_surface, text_rect)
 
@@ -154,14 +181,22 @@ class ModernSlider:
         self.label = label
         self.value = initial_value
         self.dragging = False
-        self.font = pygame.font.SysFont('Segoe UI', 14)
         self.handle_rect = pygame.Rect(0, 0, 12, height + 8)
         self.clicked = False  # Add this line
-        
+
+    @property
+    def bounds(self) -> pygame.Rect:
+        """Area the slider paints: label above, track and overhanging handle"""
+        overhang = self.handle_rect.width
+        return pygame.Rect(self.rect.x - overhang, self.rect.y - 20,
+                           self.rect.width + 2 * overhang, self.rect.height + 24)
+
+    def state(self):
+        return self.label_text(), self.value
+
     def draw(self, surface: pygame.Surface):
         # Draw label and value
-        label_text = f"{self.label}: {self.value:.2f}"
-        label_surface = self.font.render(label_text, True, COLORS['text'])
+        label_surface = render_text(self.label_text(), COLORS['text'])
         surface.blit(label_surface, (self.rect.x, self.rect.y - 20))
         
         # Draw track background
@@ -180,6 +215,9 @@ class ModernSlider:
         self.handle_rect.centery = self.rect.centery
         draw_rounded_rect(surface, self.handle_rect, COLORS['slider_handle'], 6)
 
+    def label_text(self) -> str:
+        return f"{self.label}: {self.value:.2f}"
+
     def handle_event(self, event):
         """Handle mouse events for the slider"""
         if event.type == pygame.MOUSEBUTTONDOWN:
@@ -194,6 +232,28 @@ class ModernSlider:
             rel_x = max(0, min(mouse_x - self.rect.x, self.rect.width))
             self.value = rel_x / self.rect.width
 
+class ModernChoiceSlider(ModernSlider):
+    """Slider that snaps to a fixed list of choices"""
+    def __init__(self, x: int, y: int, width: int, height: int, label: str, choices: List, initial_index: int = 0):
+        self.choices = choices
+        super().__init__(x, y, width, height, label, self._index_to_value(initial_index))
+
+    def _index_to_value(self, index: int) -> float:
+        return index / max(len(self.choices) - 1, 1)
+
+    @property
+    def selected(self):
+        index = int(round(self.value * (len(self.choices) - 1)))
+        return self.choices[index]
+
+    def handle_event(self, event):
+        super().handle_event(event)
+        # Snap the handle to the nearest choice
+        self.value = self._index_to_value(self.choices.index(self.selected))
+
+    def label_text(self) -> str:
+        return f"{self.label}: {self.selected if self.selected is not None else 'All'}"
+
 class ModernProgressBar:
     def __init__(self, x: int, y: int, width: int, height: int):
         self.rect = pygame.Rect(x, y, width, height)
@@ -225,6 +285,9 @@ class PyValentinGUI:
         self.files = {'csv': None, 'config': None, 'filter': None, 'grade': None}
         self.dragging_file = False
         self.drag_pos = None
+        self.worker = None
+        # Widget state as last painted, so draw() only repaints what changed
+        self.painted = {}
         
     def layout_ui(self):
         """Create modern VS Code-like layout"""
@@ -251,11 +314,13 @@ class PyValentinGUI:
         # Sliders with proper spacing
         self.quality_slider = ModernSlider(start_x, start_y + 260, button_width, 8, 
                                          "Quality Weight", 0.5)
-        self.grade_slider = ModernSlider(start_x, start_y + 320, button_width, 8, 
+        self.top_k_slider = ModernChoiceSlider(start_x, start_y + 320, button_width, 8,
+                                             "Top-K Candidates", TOP_K_CHOICES)
+        self.grade_slider = ModernSlider(start_x, start_y + 380, button_width, 8, 
                                        "Grade Weight", 0.7)
         
         # Process button at bottom
-        self.buttons['process'] = ModernButton(start_x, start_y + 400, button_width, button_height,
+        self.buttons['process'] = ModernButton(start_x, start_y + 420, button_width, button_height,
                                              "Process Files", self.process_files)
         self.buttons['process'].active = False
         
@@ -297,6 +362,8 @@ class PyValentinGUI:
         return file_path if file_path else None
         
     def update_status(self):
+        if self.worker is not None:
+            return
         if all(self.files.values()):
             self.status_message = "Ready to process"
             self.status_color = COLORS['success']
@@ -307,59 +374,42 @@ class PyValentinGUI:
             self.buttons['process'].active = False
             
     def process_files(self):
-        if not all(self.files.values()):
+        """Start the pipeline on a worker thread; it reports back through events"""
+        if not all(self.files.values()) or self.worker is not None:
             return
-            
+        self.buttons['process'].active = False
+        self.status_color = COLORS['text']
+        self.worker = threading.Thread(
+            target=self.run_pipeline,
+            args=(dict(self.files), self.quality_slider.value, self.grade_slider.value, self.top_k_slider.selected),
+            name="pipeline", daemon=True)
+        self.worker.start()
+
+    def run_pipeline(self, files: Dict[str, str], quality_weight, grade_weight, top_k):
+        """Run the shared core.batch stages on the worker thread; never touches the display"""
+        def post(kind, **attributes):
+            pygame.event.post(pygame.event.Event(kind, **attributes))
+        progress = StageProgress(batch.PIPELINE_STAGES, lambda percent, text: post(PIPELINE_PROGRESS, percent=percent, text=text))
+
         try:
-            # Stage 1: Initialize and process CSV
-            self.status_message = "Stage 1/5: Processing CSV..."
-            self.progress_bar.progress = 0.2
-            self.draw()
-            
-            output_dir = os.path.join(os.path.dirname(__file__), "core", "genR")
-            os.makedirs(output_dir, exist_ok=True)
-            output_file = os.path.join(output_dir, "modified_csv.csv")
-            
-            replace_values_in_csv(self.files['csv'], self.files['config'], output_file)
-            
-            # Stage 2: Calculate distances
-            self.status_message = "Stage 2/5: Calculating distances..."
-            self.progress_bar.progress = 0.4
-            self.draw()
-            
-            data = process_csv(output_file)
-            distances = calculate_distances(data)
-            save_processed_data(distances, os.path.join(output_dir, "processed_distances.csv"))
-            
-            # Stage 3: Compute similarities
-            self.status_message = "Stage 3/5: Computing similarities..."
-            self.progress_bar.progress = 0.6
-            self.draw()
-            
-            similarity = calculate_similarity(distances)
-            save_processed_data(similarity, os.path.join(output_dir, "similarity_list.csv"))
-            
-            # Stage 4: Filter matches
-            self.status_message = "Stage 4/5: Filtering matches..."
-            self.progress_bar.progress = 0.8
-            self.draw()
-            
-            # Stage 5: Create pairs
-            self.status_message = "Stage 5/5: Creating optimal pairs..."
-            self.progress_bar.progress = 1.0
-            self.draw()
-            
-            # Analysis
-            analyzer = MatchAnalysis(output_dir)
-            analyzer.analyze_all_algorithms()
-            
-            self.status_message = "Processing completed! Check core/genR folder"
-            self.status_color = COLORS['success']
-            
+            batch.run_pipeline(files['csv'], files['config'], files['grade'], quality_weight, grade_weight, top_k,
+                               progress)
+            post(PIPELINE_DONE, message="Processing completed! Check core/genR folder", color=COLORS['success'])
         except Exception as e:
-            self.status_message = f"Error: {str(e)}"
-            self.status_color = COLORS['error']
+            post(PIPELINE_DONE, message=f"Error: {str(e)}", color=COLORS['error'])
+
+    def handle_pipeline_event(self, event):
+        """Apply a worker event on the main thread"""
+        if event.type == PIPELINE_PROGRESS:
+            self.status_message = event.text
+            self.progress_bar.progress = event.percent / 100
+            return
+        self.worker = None
+        self.status_message = event.message
+        self.status_color = event.color
+        if event.color == COLORS['error']:
             self.progress_bar.progress = 0
+        self.buttons['process'].active = all(self.files.values())
             
     def handle_drag_and_drop(self, event):
         """Handle file drag and drop events"""
@@ -394,47 +444,68 @@ class PyValentinGUI:
         elif event.type == pygame.MOUSEMOTION:
             self.drag_pos = event.pos
     
-    def draw(self):
-        self.screen.fill(COLORS['background'])
+    def draw_footer(self, surface: pygame.Surface):
+        """Progress bar, status message and drag-and-drop hint"""
+        self.progress_bar.draw(surface)
         
-        # Draw buttons
-        for button in self.buttons.values():
-            button.draw(self.screen)
-            
-        # Draw sliders
-        self.quality_slider.draw(self.screen)
-        self.grade_slider.draw(self.screen)
-        
-        # Draw progress bar
-        self.progress_bar.draw(self.screen)
-        
-        # Draw status message
-        font = pygame.font.SysFont('Segoe UI', 18)  # Changed from Font(None, 24)
-        status_surface = font.render(self.status_message, True, self.status_color)
+        status_surface = render_text(self.status_message, self.status_color, 18)
         status_rect = status_surface.get_rect(center=(WINDOW_SIZE[0]//2, WINDOW_SIZE[1]-30))
-        self.screen.blit(status_surface, status_rect)
+        surface.blit(status_surface, status_rect)
         
         # Add drag-and-drop hint text when no files are selected
         if not all(self.files.values()):
-            hint_font = pygame.font.SysFont('Segoe UI', 14)
-            hint_text = "Drag and drop files onto buttons to upload"
-            hint_surface = hint_font.render(hint_text, True, COLORS['text_disabled'])
+            hint_surface = render_text("Drag and drop files onto buttons to upload", COLORS['text_disabled'])
             hint_rect = hint_surface.get_rect(center=(WINDOW_SIZE[0]//2, WINDOW_SIZE[1]-60))
-            self.screen.blit(hint_surface, hint_rect)
-        
-        pygame.display.flip()
+            surface.blit(hint_surface, hint_rect)
+
+    def regions(self):
+        """(name, bounds, state, draw) for each independently repainted area"""
+        for name, button in self.buttons.items():
+            yield name, button.bounds, button.state(), button.draw
+        for name, slider in (('quality', self.quality_slider), ('top_k', self.top_k_slider),
+                             ('grade', self.grade_slider)):
+            yield name, slider.bounds, slider.state(), slider.draw
+        footer_state = (self.progress_bar.progress, self.status_message, self.status_color,
+                        all(self.files.values()))
+        footer = pygame.Rect(0, WINDOW_SIZE[1] - 80, WINDOW_SIZE[0], 80)
+        yield 'footer', footer, footer_state, self.draw_footer
+
+    def draw(self, full: bool = False):
+        """Repaint the areas whose state changed, or the whole window if full"""
+        if full:
+            self.screen.fill(COLORS['background'])
+            self.painted.clear()
+        dirty = []
+        for name, bounds, state, draw in self.regions():
+            if self.painted.get(name) == state:
+                continue
+            self.painted[name] = state
+            self.screen.fill(COLORS['background'], bounds)
+            draw(self.screen)
+            dirty.append(bounds)
+        if full:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
         
     def run(self):
         running = True
-        clock = pygame.time.Clock()  # Add this line for consistent frame rate
+        animating = False
         
         # Enable file drop
         pygame.event.set_allowed([pygame.DROPFILE])
+        self.draw(full=True)
         
         while running:
-            for event in pygame.event.get():
+            # Sleep until something happens, or one frame while animating
+            first = pygame.event.wait(ANIMATION_FRAME_MS if animating else 0)
+            for event in [first] + pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
+                elif event.type in (PIPELINE_PROGRESS, PIPELINE_DONE):
+                    self.handle_pipeline_event(event)
+                elif event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+                    self.painted.clear()
                 elif event.type == pygame.DROPFILE:
                     self.handle_drag_and_drop(event)
                 elif event.type == pygame.MOUSEMOTION and self.dragging_file:
@@ -446,14 +517,20 @@ class PyValentinGUI:
                     
                     # Handle slider events
                     self.quality_slider.handle_event(event)
+                    self.top_k_slider.handle_event(event)
                     self.grade_slider.handle_event(event)
-                
-            self.draw()
-            clock.tick(60)  # Limit to 60 FPS
+            
+            mouse_pos = pygame.mouse.get_pos()
+            animating = any([button.update(mouse_pos) for button in self.buttons.values()])
+            self.draw(full=not self.painted)
             
         pygame.quit()
         sys.exit()
 
-if __name__ == "__main__":
+def main():
+    pygame.init()
     app = PyValentinGUI()
     app.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Copyright (c) 2025
+This program is part of PyValentin
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BenchmarkMatching import fixture_similarity
+from core.batch import create_grade_sensitive_pairs
+from core.matching import RankIndex
+from core.respondents import NO_GRADE
+
+# GenerateTests fixtures compared by default; pass test_users_10000.csv
+# explicitly, with --top-k, as its full lists take gigabytes
+FIXTURES = ["test_users.csv", "test_users_700.csv"]
+
+def random_grades(emails, low, high, ungraded, seed=0):
+    """Grade map as a grade CSV would give it, leaving out a fraction ungraded"""
+    rng = np.random.default_rng(seed)
+    values = rng.integers(low, high + 1, size=len(emails))
+    missing = rng.random(len(emails)) < ungraded
+    return {email: int(grade) for email, grade, skip in zip(emails, values.tolist(), missing.tolist()) if not skip}
+
+def solve(ranks, grade_data, grades, grade_weight, banded):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pairs = create_grade_sensitive_pairs(ranks, grade_data, grade_weight, grades, banded=banded)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(pairs), sum(float(pair[2]) for pair in pairs)
+
+def benchmark(csv_file, args):
+    similarity_data = fixture_similarity(csv_file, args.top_k)
+    ranks = RankIndex.from_rows(similarity_data)
+    grade_data = random_grades([row[0] for row in similarity_data], args.low_grade, args.high_grade,
+                               args.ungraded, args.seed)
+    grades = np.array([grade_data.get(email, NO_GRADE) for email in ranks.ids.emails], dtype=np.int64)
+    print(f"{os.path.basename(csv_file)}: {len(similarity_data)} respondents, "
+          f"grades {args.low_grade}-{args.high_grade}, top-K {args.top_k or 'all'}")
+
+    full = solve(ranks, grade_data, grades, args.grade_weight, False)
+    banded = solve(ranks, grade_data, grades, args.grade_weight, True)
+    for name, (elapsed, count, quality) in (("full", full), ("banded", banded)):
+        print(f"  {name:<7} {elapsed:8.3f}s  {count} pairs, total quality {quality:.3f}")
+    if full[2]:
+        print(f"  gap     {full[1] - banded[1]} pairs, "
+              f"{100 * (full[2] - banded[2]) / full[2]:.2f}% total quality, "
+              f"{full[0] / banded[0]:.1f}x faster")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare grade-banded and full grade-sensitive matching")
+    parser.add_argument("csv_files", nargs='*',
+                        help="survey CSVs (default: the GenerateTests fixtures in this folder)")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="candidates per list (full lists by default)")
+    parser.add_argument("--low-grade", type=int, default=9)
+    parser.add_argument("--high-grade", type=int, default=12)
+    parser.add_argument("--ungraded", type=float, default=0.05,
+                        help="fraction of respondents missing from the grade CSV")
+    parser.add_argument("--grade-weight", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    csv_files = args.csv_files or [os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+                                   for name in FIXTURES]
+    for csv_file in csv_files:
+        benchmark(csv_file, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Copyright (c) 2025
+This program is part of PyValentin
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.Ski import process_csv, calculate_distances, pair_midpoint_distances, iter_ranked_blocks
+from core.matching import MatchMaker
+
+def fixture_similarity(csv_file, top_k=None):
+    """Similarity rows for a survey CSV, as stage 3 ranks them"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        distances = calculate_distances(process_csv(csv_file))
+    emails = [row[0] for row in distances]
+    features = np.array([row[1:] for row in distances], dtype=np.float64)
+    return ranked_rows(emails, features, top_k)
+
+def synthetic_similarity(n, top_k, questions=20, seed=0):
+    """Similarity rows for n random survey answers on a 1-4 scale"""
+    rng = np.random.default_rng(seed)
+    answers = rng.integers(1, 5, size=(n, questions)).astype(np.float64)
+    emails = [f"user{i + 1}@test.com" for i in range(n)]
+    return ranked_rows(emails, pair_midpoint_distances(answers), top_k)
+
+def ranked_rows(emails, features, top_k):
+    rows = []
+    for _, block in iter_ranked_blocks(np.ascontiguousarray(features), top_k=top_k):
+        for i, ranked in zip(range(len(rows), len(rows) + len(block)), block):
+            rows.append([emails[i]] + [emails[j] for j in ranked.tolist()])
+    return rows
+
+def run_matcher(name, create):
+    start = time.perf_counter()
+    pairs, unpaired = create()
+    return name, time.perf_counter() - start, pairs, unpaired
+
+def report(matchmaker, results):
+    for name, elapsed, pairs, unpaired in results:
+        scores = [matchmaker.score(a, b) for a, b in pairs]
+        listed = [score for score in scores if score is not None]
+        mean_score = sum(listed) / len(listed) if listed else 0.0
+        print(f"  {name:<12} {elapsed:8.3f}s  {len(pairs)} pairs, {len(unpaired)} unpaired, "
+              f"{len(pairs) - len(listed)} unlisted, mean score {mean_score:.3f}")
+
+def benchmark(label, similarity_data, quality_weight, skip_two_pass):
+    start = time.perf_counter()
+    matchmaker = MatchMaker(similarity_data, quality_weight)
+    print(f"{label}: {len(similarity_data)} respondents, setup {time.perf_counter() - start:.3f}s, "
+          f"score table {matchmaker.match_scores.nbytes / 2**20:.1f} MiB")
+    results = []
+    if not skip_two_pass:
+        results.append(run_matcher("two-pass", matchmaker.create_pairs))
+    results.append(run_matcher("global", matchmaker.create_global_pairs))
+    report(matchmaker, results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MatchMaker strategies")
+    parser.add_argument("csv_file", nargs='?',
+                        default=os.path.join(os.path.dirname(__file__), "test_users_700.csv"))
+    parser.add_argument("--synthetic", type=int, default=50000,
+                        help="respondents in the synthetic survey (0 to skip)")
+    parser.add_argument("--top-k", type=int, default=25,
+                        help="candidates per list for the synthetic survey")
+    parser.add_argument("--quality-weight", type=float, default=0.5)
+    parser.add_argument("--skip-two-pass", action='store_true',
+                        help="only time the global heap matcher on the synthetic survey")
+    args = parser.parse_args()
+
+    benchmark(args.csv_file, fixture_similarity(args.csv_file), args.quality_weight, False)
+    if args.synthetic:
+        similarity = synthetic_similarity(args.synthetic, args.top_k)
+        benchmark(f"Synthetic top-{args.top_k}", similarity, args.quality_weight, args.skip_two_pass)
+
+if __name__ == "__main__":
+    main()
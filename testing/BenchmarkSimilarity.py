@@ -0,0 +1,74 @@
+"""
+Copyright (c) 2025
+This program is part of PyValentin
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.Ski import process_csv, calculate_distances, calculate_similarity, SIMILARITY_BLOCK_SIZE
+
+def run_similarity(distances, top_k=None, workers=1, block_size=SIMILARITY_BLOCK_SIZE):
+    """Run stage 3 and return (seconds, similarity list)"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        similarity = calculate_similarity(distances, top_k=top_k, workers=workers, block_size=block_size)
+    return time.perf_counter() - start, similarity
+
+def written_size(rows):
+    """Size in bytes of the similarity list once written as CSV"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "similarity_list.csv")
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+        return os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the similarity stage")
+    parser.add_argument("csv_file", nargs='?',
+                        default=os.path.join(os.path.dirname(__file__), "test_users_700.csv"))
+    parser.add_argument("--top-k", type=int, nargs='+', default=[10, 25, 50])
+    parser.add_argument("--workers", type=int, nargs='+', default=[],
+                        help="worker counts to benchmark for scaling, e.g. 1 2 4 8")
+    parser.add_argument("--block-size", type=int, default=SIMILARITY_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        distances = calculate_distances(process_csv(args.csv_file))
+
+    full_time, full_similarity = run_similarity(distances)
+    full_size = written_size(full_similarity)
+    print(f"{len(distances)} respondents from {args.csv_file}")
+    print(f"Full lists: {full_time:.3f}s, {full_size / 1024:.1f} KiB")
+
+    for top_k in args.top_k:
+        elapsed, similarity = run_similarity(distances, top_k=top_k)
+        size = written_size(similarity)
+        print(f"Top-{top_k}: {elapsed:.3f}s ({full_time / elapsed:.1f}x faster), "
+              f"{size / 1024:.1f} KiB ({full_size / size:.1f}x smaller)")
+
+    if args.workers:
+        top_k = args.top_k[0] if args.top_k else None
+        baseline_time, baseline = None, None
+        for workers in args.workers:
+            elapsed, similarity = run_similarity(distances, top_k=top_k, workers=workers,
+                                                 block_size=args.block_size)
+            if baseline is None:
+                baseline_time, baseline = elapsed, similarity
+            identical = "identical" if similarity == baseline else "DIFFERENT"
+            print(f"{workers} worker(s), top-{top_k}: {elapsed:.3f}s "
+                  f"({baseline_time / elapsed:.2f}x speedup, output {identical})")
+
+if __name__ == "__main__":
+    main()
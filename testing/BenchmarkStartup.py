@@ -0,0 +1,62 @@
+"""
+Copyright (c) 2025
+This program is part of PyValentin
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so every sample is a cold start of main.py
+STARTUP_PROBE = r"""
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, os.getcwd())
+import main
+timings = {'import_main': time.perf_counter() - start}
+main.install_dependencies()
+timings['dependency_check'] = time.perf_counter() - start - timings['import_main']
+timings['pipeline_loaded'] = 'core.batch' in sys.modules
+if sys.argv[1] == 'window':
+    root = main.create_root()
+    main.create_ui(root)
+    root.deiconify()
+    root.update()
+    timings['window'] = time.perf_counter() - start
+    root.destroy()
+print(json.dumps(timings))
+"""
+
+def display_available():
+    return sys.platform in ('win32', 'darwin') or bool(os.environ.get('DISPLAY'))
+
+def sample(mode):
+    output = subprocess.check_output([sys.executable, "-c", STARTUP_PROBE, mode], cwd=REPO)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start of the Tk front end")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-window", action='store_true',
+                        help="only time imports and the dependency check (for headless machines)")
+    args = parser.parse_args()
+
+    mode = 'window' if display_available() and not args.no_window else 'imports'
+    samples = [sample(mode) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts ({mode}), pipeline imported at startup: "
+          f"{any(s['pipeline_loaded'] for s in samples)}")
+    for key in ('import_main', 'dependency_check', 'window'):
+        if key in samples[0]:
+            values = [s[key] for s in samples]
+            print(f"  {key:<17} median {statistics.median(values):.3f}s  max {max(values):.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import contextlib
+import io
+import os
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from core.respondents import RespondentTable
+from core.Ski import pair_midpoint_distances
+
+@lru_cache(maxsize=None)
+def fixture_respondents():
+    """The 700-row test survey, read as the pipeline reads it"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return RespondentTable.from_files(os.path.join(REPO_DIR, "testing", "test_users_700.csv"),
+                                          os.path.join(REPO_DIR, "Config.json"))
+
+def survey_features(rows, duplicates=0, seed=0):
+    """Distance features of the first rows survey answers, followed by
+    duplicates more respondents who repeat one of them exactly"""
+    answers = fixture_respondents().answers[:rows]
+    if duplicates:
+        repeated = np.random.default_rng(seed).integers(0, rows, size=duplicates)
+        answers = np.concatenate([answers, answers[repeated]])
+    return np.ascontiguousarray(pair_midpoint_distances(answers))
+
+def survey_people(n, seed=0):
+    """Random gender/preference data for n respondents, as compile_compatibility takes it"""
+    rng = np.random.default_rng(seed)
+    return [{"gender": str(gender), "wants": str(wants)} for gender, wants in rng.integers(1, 4, size=(n, 2))]
+
+@pytest.fixture
+def features():
+    return survey_features(40, duplicates=15)
@@ -0,0 +1,98 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from conftest import survey_features, survey_people
+from core import batch
+from core.batch import (
+    UNLISTED_GRADE_COST, UNLISTED_HUNGARIAN_COST, compatibility_buckets, dense_assignment, grade_cost_cells,
+    grade_cost_matrix, hungarian_cells, sorted_members, sparse_assignment,
+)
+from core.matching import RankIndex
+from core.rankstore import RankLists
+from core.Ski import iter_ranked_blocks
+
+def random_cells(n, density, seed):
+    """(lo, hi, costs) of a random symmetric cost matrix, each cell once"""
+    rng = np.random.default_rng(seed)
+    lo, hi = np.triu_indices(n, k=1)
+    keep = rng.random(len(lo)) < density
+    return lo[keep], hi[keep], rng.random(int(keep.sum()))
+
+def dense_matrix(lo, hi, costs, n, unlisted_cost):
+    cost_matrix = np.full((n, n), unlisted_cost)
+    cost_matrix[lo, hi] = costs
+    cost_matrix[hi, lo] = costs
+    return cost_matrix
+
+def survey_ranks(n, top_k):
+    """RankIndex of filtered top-K lists over the first n survey rows"""
+    emails = [f"user{i}@test.com" for i in range(n)]
+    buckets = compatibility_buckets(survey_people(n))
+    lists = [ranked for _, block in iter_ranked_blocks(survey_features(n), top_k=top_k, buckets=buckets)
+             for ranked in block]
+    return RankIndex.from_rank_lists(RankLists.from_id_lists(emails, np.arange(n), lists))
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("density", [0.02, 0.1, 0.5])
+def test_sparse_assignment_matches_dense(seed, density):
+    n = 80
+    lo, hi, costs = random_cells(n, density, seed)
+    sparse_rows, sparse_cols, sparse_costs = sparse_assignment(lo, hi, costs, n, UNLISTED_HUNGARIAN_COST)
+    dense_rows, dense_cols, dense_costs = dense_assignment(dense_matrix(lo, hi, costs, n, UNLISTED_HUNGARIAN_COST),
+                                                           UNLISTED_HUNGARIAN_COST)
+
+    # Both are optimal: as many listed cells, at the same total cost
+    assert len(sparse_rows) == len(dense_rows)
+    assert sparse_costs.sum() == pytest.approx(dense_costs.sum())
+    # Each row gets at most one column, and the costs are those of the cells
+    assert len(np.unique(sparse_rows)) == len(sparse_rows)
+    assert len(np.unique(sparse_cols)) == len(sparse_cols)
+    cost_matrix = dense_matrix(lo, hi, costs, n, UNLISTED_HUNGARIAN_COST)
+    assert np.array_equal(cost_matrix[sparse_rows, sparse_cols], sparse_costs)
+
+def test_sparse_assignment_without_cells():
+    none = np.empty(0, dtype=np.int64)
+    rows, cols, costs = sparse_assignment(none, none, np.empty(0), 5, UNLISTED_HUNGARIAN_COST)
+    assert len(rows) == len(cols) == len(costs) == 0
+
+def test_hungarian_cells_match_dense_matrix():
+    ranks = survey_ranks(120, top_k=6)
+    members, row_of = sorted_members(ranks)
+    n = len(members)
+
+    # The dense matrix as create_hungarian_pairs builds it
+    cost_matrix = np.full((n, n), UNLISTED_HUNGARIAN_COST)
+    owners = ranks.edge_owners
+    cost_matrix[row_of[owners], row_of[ranks.candidates]] = ranks.positions / np.maximum(ranks.lengths[owners], 1)
+    cost_matrix = np.minimum(cost_matrix, cost_matrix.T)
+
+    lo, hi, costs = hungarian_cells(ranks, row_of)
+    assert np.array_equal(dense_matrix(lo, hi, costs, n, UNLISTED_HUNGARIAN_COST), cost_matrix)
+
+def test_grade_cost_cells_match_dense_matrix():
+    ranks = survey_ranks(120, top_k=6)
+    members, row_of = sorted_members(ranks)
+    grades = np.random.default_rng(0).integers(9, 13, size=len(ranks))
+
+    cost_matrix = grade_cost_matrix(ranks, row_of, len(members), grades, 0.7)
+    lo, hi, costs = grade_cost_cells(ranks, row_of, grades, 0.7)
+    assert np.array_equal(dense_matrix(lo, hi, costs, len(members), UNLISTED_GRADE_COST), cost_matrix)
+
+@pytest.mark.parametrize("create", ["hungarian", "grade_sensitive"])
+def test_matchers_pair_as_well_sparse_as_dense(monkeypatch, create):
+    ranks = survey_ranks(120, top_k=6)
+    grade_data = {email: 9 + i % 4 for i, email in enumerate(ranks.ids.emails)}
+
+    def pairs(max_density):
+        monkeypatch.setattr(batch, "SPARSE_ASSIGNMENT_MAX_DENSITY", max_density)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if create == "hungarian":
+                return batch.create_hungarian_pairs(ranks)
+            return batch.create_grade_sensitive_pairs(ranks, grade_data, 0.7, banded=False)
+
+    sparse, dense = pairs(1.0), pairs(0.0)
+    assert len(sparse) == len(dense)
+    assert sum(pair[2] for pair in sparse) == pytest.approx(sum(pair[2] for pair in dense))
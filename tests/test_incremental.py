@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from conftest import survey_features, survey_people
+from core.batch import compatibility_buckets, compile_compatibility
+from core.incremental import merge_new_rows
+from core.rankstore import RankLists
+from core.Ski import iter_ranked_blocks
+
+# 100 respondents whose last 30 repeat earlier answers, so new rows tie
+# with old ones and with each other
+FEATURES = survey_features(70, duplicates=30)
+PEOPLE = survey_people(len(FEATURES))
+
+def ranked_lists(features, top_k=None, people=None, first=0):
+    buckets = compatibility_buckets(people) if people is not None else None
+    return [ranked.tolist() for _, block in iter_ranked_blocks(features, 16, top_k, buckets=buckets, first=first)
+            for ranked in block]
+
+def merged_lists(first, top_k=None, filtered=False):
+    """Lists of the first respondents with everyone after them merged in"""
+    people = PEOPLE[:first] if filtered else None
+    old = ranked_lists(FEATURES[:first], top_k, people)
+    lists = RankLists.from_id_lists([f"user{i}@test.com" for i in range(first)], np.arange(first), old)
+    eligible = None
+    if filtered:
+        accepts, wants_codes, gender_codes = compile_compatibility(PEOPLE)
+        eligible = lambda owners, row: accepts[wants_codes[owners], gender_codes[row]]
+    merged = merge_new_rows(FEATURES, lists, range(first, len(FEATURES)), eligible=eligible, top_k=top_k)
+    return [ids.tolist() for ids in merged]
+
+# One new row searches the lists; many use the precomputed list distances
+@pytest.mark.parametrize("first", [99, 80, 40])
+@pytest.mark.parametrize("top_k", [None, 5])
+def test_merge_new_rows_matches_full_rerun(first, top_k):
+    assert merged_lists(first, top_k) == ranked_lists(FEATURES, top_k)[:first]
+
+@pytest.mark.parametrize("first", [99, 80, 40])
+@pytest.mark.parametrize("top_k", [None, 5])
+def test_merge_new_rows_into_filtered_lists_matches_full_rerun(first, top_k):
+    assert merged_lists(first, top_k, filtered=True) == ranked_lists(FEATURES, top_k, PEOPLE)[:first]
+
+def test_new_rows_rank_as_in_full_rerun():
+    assert ranked_lists(FEATURES, 5, PEOPLE, first=80) == ranked_lists(FEATURES, 5, PEOPLE)[80:]
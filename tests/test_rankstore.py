@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from core.pipeline import store_ranked_blocks
+from core.rankstore import NO_MATCHES, RankLists, load_rank_lists, save_rank_lists
+
+EMAILS = [f"user{i}@test.com" for i in range(6)]
+
+def sample_lists():
+    # Owner 3 has no matches; owner 4 is not listed at all
+    return RankLists.from_id_lists(EMAILS, [0, 1, 2, 3, 5], [[1, 2, 5], [0], [5, 0, 1, 3], [], [2]])
+
+def assert_same_lists(loaded, expected):
+    assert loaded.emails == expected.emails
+    assert np.array_equal(loaded.owners, expected.owners)
+    assert np.array_equal(loaded.indptr, expected.indptr)
+    assert np.array_equal(loaded.indices, expected.indices)
+    assert loaded.to_rows() == expected.to_rows()
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_saved_lists_load_unchanged(tmp_path, mmap):
+    lists = sample_lists()
+    save_rank_lists(str(tmp_path / "lists"), lists)
+    assert_same_lists(load_rank_lists(str(tmp_path / "lists"), mmap=mmap), lists)
+
+def test_rows_round_trip():
+    lists = sample_lists()
+    rows = lists.to_rows()
+    assert rows[3] == [EMAILS[3], NO_MATCHES]
+    assert_same_lists(RankLists.from_rows(rows, EMAILS), lists)
+
+def test_csv_export_matches_rows(tmp_path):
+    lists = sample_lists()
+    lists.write_csv(str(tmp_path / "lists.csv"))
+    with open(tmp_path / "lists.csv") as f:
+        assert [line.rstrip('\n').split(',') for line in f] == lists.to_rows()
+
+def test_streamed_blocks_load_as_written(tmp_path):
+    ranked = [np.array([(i + step) % len(EMAILS) for step in range(1, 4)]) for i in range(len(EMAILS))]
+    blocks = [(0, ranked[:4]), (4, ranked[4:])]
+
+    # The blocks pass through unchanged while the store is written
+    passed = list(store_ranked_blocks(iter(blocks), str(tmp_path / "similarity_list"), EMAILS, 3))
+    assert passed == blocks
+    expected = RankLists.from_id_lists(EMAILS, np.arange(len(EMAILS)), ranked)
+    assert_same_lists(load_rank_lists(str(tmp_path / "similarity_list")), expected)
@@ -0,0 +1,49 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from conftest import survey_features, survey_people
+from core.batch import compatibility_buckets
+from core.Ski import SIMILARITY_BLOCK_SIZE, calculate_similarity, iter_ranked_blocks
+
+def similarity_rows(features, engine, top_k=None, block_size=SIMILARITY_BLOCK_SIZE):
+    data = [[f"user{i}@test.com"] + row for i, row in enumerate(features.tolist())]
+    with contextlib.redirect_stdout(io.StringIO()):
+        return calculate_similarity(data, engine=engine, block_size=block_size, top_k=top_k)
+
+def ranked_lists(features, top_k=None, buckets=None, block_size=SIMILARITY_BLOCK_SIZE):
+    return [ranked.tolist() for _, block in iter_ranked_blocks(features, block_size, top_k, buckets=buckets)
+            for ranked in block]
+
+@pytest.mark.parametrize("top_k", [None, 5])
+@pytest.mark.parametrize("block_size", [7, SIMILARITY_BLOCK_SIZE])
+def test_numpy_engine_matches_loop_engine(features, top_k, block_size):
+    assert similarity_rows(features, "numpy", top_k, block_size) == similarity_rows(features, "loop", top_k)
+
+def test_identical_respondents_are_listed_in_row_order():
+    # Users with the same answers are exactly as far from everyone, so each
+    # list must hold them in row order, as the loop engine does
+    features = survey_features(700, duplicates=120)
+    _, first, inverse = np.unique(features, axis=0, return_index=True, return_inverse=True)
+    representatives = first[inverse.ravel()]
+    for ranked in ranked_lists(features, block_size=64):
+        ranked = np.asarray(ranked)
+        # Group the list by answers, keeping list order within each group
+        order = np.argsort(representatives[ranked], kind='stable')
+        grouped, groups = ranked[order], representatives[ranked][order]
+        twins = groups[1:] == groups[:-1]
+        assert (grouped[1:][twins] > grouped[:-1][twins]).all()
+
+def test_block_size_does_not_change_lists(features):
+    assert ranked_lists(features, block_size=7) == ranked_lists(features)
+
+def test_bucketed_lists_are_filtered_full_lists(features):
+    row_codes, code_columns = buckets = compatibility_buckets(survey_people(len(features)))
+    accepted = [set(code_columns[code].tolist()) for code in row_codes.tolist()]
+    full = [[j for j in ranked if j in accepted[i]] for i, ranked in enumerate(ranked_lists(features))]
+
+    assert ranked_lists(features, buckets=buckets) == full
+    # Top-K lists hold the K best compatible candidates
+    assert ranked_lists(features, top_k=4, buckets=buckets) == [ranked[:4] for ranked in full]
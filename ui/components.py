@@ -42,6 +42,65 @@ def create_quality_slider(parent):
     
     return slider
 
+def create_top_k_input(parent):
+    """Create the top-K candidates input shown next to the quality slider"""
+    frame = tk.Frame(parent, bg='#1e1e1e', highlightthickness=0)
+    frame.pack(fill='x', pady=5)
+    
+    ttk.Label(frame, text="Top-K Candidates (0 = all):").pack(side='left', padx=5)
+    
+    spinbox = ttk.Spinbox(frame, from_=0, to=10000, increment=5, width=8)
+    spinbox.set(0)
+    spinbox.pack(side='right', padx=5)
+    
+    return spinbox
+
+def create_memory_budget_input(parent):
+    """Create the similarity memory budget input shown below the top-K input"""
+    frame = tk.Frame(parent, bg='#1e1e1e', highlightthickness=0)
+    frame.pack(fill='x', pady=5)
+    
+    ttk.Label(frame, text="Similarity Memory MB (0 = default):").pack(side='left', padx=5)
+    
+    spinbox = ttk.Spinbox(frame, from_=0, to=65536, increment=256, width=8)
+    spinbox.set(0)
+    spinbox.pack(side='right', padx=5)
+    
+    return spinbox
+
+def create_incremental_checkbox(parent):
+    """Create the checkbox that matches only newly added responses; returns its variable"""
+    variable = tk.BooleanVar(value=False)
+    ttk.Checkbutton(
+        parent,
+        text="Only match new responses into the last run's pairs",
+        variable=variable
+    ).pack(anchor='w', padx=5, pady=5)
+    
+    return variable
+
+def create_blossom_checkbox(parent):
+    """Create the checkbox that adds the slow Blossom matcher; returns its variable"""
+    variable = tk.BooleanVar(value=False)
+    ttk.Checkbutton(
+        parent,
+        text="Also pair with Blossom matching (slow)",
+        variable=variable
+    ).pack(anchor='w', padx=5, pady=5)
+    
+    return variable
+
+def create_grade_banded_checkbox(parent):
+    """Create the checkbox that matches grades band by band; returns its variable"""
+    variable = tk.BooleanVar(value=False)
+    ttk.Checkbutton(
+        parent,
+        text="Match grades band by band (faster, slightly lower quality)",
+        variable=variable
+    ).pack(anchor='w', padx=5, pady=5)
+    
+    return variable
+
 def create_action_buttons(parent, process_callback):
     """Create action buttons for the UI"""
     button_frame = tk.Frame(parent, bg='#1e1e1e')
@@ -54,9 +113,21 @@ def create_action_buttons(parent, process_callback):
         state='disabled'
     )
     process_button.pack(fill='x', pady=5)
-    
+
     return process_button
 
+def create_cancel_button(parent, cancel_callback):
+    """Create the button that cancels a running pipeline"""
+    cancel_button = ttk.Button(
+        parent,
+        text="Cancel",
+        command=cancel_callback,
+        state='disabled'
+    )
+    cancel_button.pack(fill='x', pady=5)
+
+    return cancel_button
+
 def open_folder(path):
     """Open folder in file explorer (cross-platform)"""
     abs_path = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(__file__)), path))